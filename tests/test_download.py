@@ -0,0 +1,275 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from pathlib import Path
+
+import httpx
+import pytest
+
+from v2dl.utils.download import AlbumTracker, Downloader, FolderCache, PathUtil
+
+IMAGE = b"\x89PNG" + b"\x00" * 1024
+
+
+def mock_transport(statuses, headers=None):
+    """Serve the given status codes in order, the last one repeats."""
+    calls = []
+
+    def handler(request):
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(request)
+        if status == 200:
+            return httpx.Response(200, stream=httpx.ByteStream(IMAGE))
+        return httpx.Response(status, headers=headers or {"Retry-After": "0"})
+
+    return httpx.MockTransport(handler), calls
+
+
+@pytest.mark.parametrize(
+    ("retry_after", "expected"),
+    [
+        ("0", 0.0),
+        ("5", 5.0),
+        ("3600", Downloader.MAX_RETRY_DELAY),
+        ("", Downloader.BACKOFF_BASE * 4),
+        ("soon", Downloader.BACKOFF_BASE * 4),
+    ],
+)
+def test_retry_delay(retry_after, expected):
+    response = httpx.Response(429, headers={"Retry-After": retry_after})
+    assert Downloader.retry_delay(response, 2) == expected
+
+
+def test_retry_delay_http_date():
+    in_a_while = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    delay = Downloader.retry_delay(httpx.Response(429, headers={"Retry-After": in_a_while}), 0)
+    assert 25 <= delay <= 30
+
+    long_ago = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert Downloader.retry_delay(httpx.Response(429, headers={"Retry-After": long_ago}), 0) == 0
+
+    far_away = format_datetime(datetime.now(timezone.utc) + timedelta(hours=1), usegmt=True)
+    delay = Downloader.retry_delay(httpx.Response(429, headers={"Retry-After": far_away}), 0)
+    assert delay == Downloader.MAX_RETRY_DELAY
+
+
+def test_download_retries_then_succeeds(tmp_path):
+    transport, calls = mock_transport([429, 429, 200])
+    save_path = tmp_path / "image.png"
+
+    with httpx.Client(transport=transport) as client:
+        Downloader.download("https://example.com/image.png", save_path, None, 1024, client)
+
+    assert len(calls) == 3
+    assert save_path.read_bytes() == IMAGE
+
+
+def test_download_retries_exhausted(tmp_path):
+    transport, calls = mock_transport([429])
+    save_path = tmp_path / "image.png"
+
+    with httpx.Client(transport=transport) as client, pytest.raises(httpx.HTTPStatusError):
+        Downloader.download("https://example.com/image.png", save_path, None, 1024, client)
+
+    assert len(calls) == Downloader.MAX_RETRIES + 1
+    assert not save_path.exists()
+
+
+def test_download_async_retries_then_succeeds(tmp_path):
+    transport, calls = mock_transport([429, 200])
+    save_path = tmp_path / "image.png"
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            url = "https://example.com/image.png"
+            await Downloader.download_async(url, save_path, None, 1024, client)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert save_path.read_bytes() == IMAGE
+
+
+def test_download_async_retries_exhausted(tmp_path):
+    transport, calls = mock_transport([429])
+    save_path = tmp_path / "image.png"
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            url = "https://example.com/image.png"
+            await Downloader.download_async(url, save_path, None, 1024, client)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert len(calls) == Downloader.MAX_RETRIES + 1
+    assert not save_path.exists()
+
+
+def test_download_throttles_small_files(tmp_path, monkeypatch):
+    # IMAGE is 1028 bytes, well below one second of a 1 KiB/s limit
+    transport, _ = mock_transport([200])
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+
+    with httpx.Client(transport=transport) as client:
+        Downloader.download("https://example.com/image.png", tmp_path / "a.png", None, 1, client)
+
+    assert sum(sleeps) == pytest.approx(len(IMAGE) / 1024, rel=0.05)
+
+
+def test_download_async_throttles_small_files(tmp_path, monkeypatch):
+    transport, _ = mock_transport([200])
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            url = "https://example.com/image.png"
+            await Downloader.download_async(url, tmp_path / "a.png", None, 1, client)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    asyncio.run(run())
+    assert sum(sleeps) == pytest.approx(len(IMAGE) / 1024, rel=0.05)
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://example.com/a/b.jpg", "jpg"),
+        ("https://example.com/a/b.webp", "webp"),
+        # the original case is kept so files from earlier runs are still skipped
+        ("https://example.com/a/b.JPG", "JPG"),
+        ("https://example.com/a/b.Png", "Png"),
+        # only the path decides, query strings and fragments are ignored
+        ("https://example.com/a/b.png?a=b.gif", "png"),
+        ("https://example.com/a/b.php?img=c.png", "jpg"),
+        ("https://example.com/a/b.png#f", "png"),
+        ("https://example.com/a/b.webp?w=100#top", "webp"),
+        ("https://example.com/a/b..png", "jpg"),
+        ("https://example.com/a/b", "jpg"),
+        ("https://example.com/a/", "jpg"),
+        ("https://example.com", "jpg"),
+        ("https://example.com/a/b.txt", "jpg"),
+        (".png", "png"),
+    ],
+)
+def test_get_image_extension(url, expected):
+    assert PathUtil.get_image_extension(url) == expected
+
+
+def test_get_image_extension_default():
+    assert PathUtil.get_image_extension("https://example.com/a/b", "png") == "png"
+
+
+def read_log(path):
+    return path.read_text().splitlines() if path.exists() else []
+
+
+def test_album_tracker_writes_once(tmp_path):
+    log_path = tmp_path / "downloaded_albums.txt"
+    tracker = AlbumTracker(str(log_path))
+
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    tracker.flush()
+
+    assert read_log(log_path) == ["https://www.v2ph.com/album/a"]
+    assert tracker.is_downloaded("https://www.v2ph.com/album/a")
+    tracker.close()
+
+
+def test_album_tracker_removes_page_number(tmp_path):
+    log_path = tmp_path / "downloaded_albums.txt"
+    tracker = AlbumTracker(str(log_path))
+
+    tracker.log_downloaded("https://www.v2ph.com/album/a?page=3")
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    tracker.close()
+
+    assert read_log(log_path) == ["https://www.v2ph.com/album/a"]
+
+
+def test_album_tracker_flush(tmp_path):
+    log_path = tmp_path / "downloaded_albums.txt"
+    tracker = AlbumTracker(str(log_path))
+
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    assert read_log(log_path) == []  # buffered
+
+    tracker.flush()
+    assert read_log(log_path) == ["https://www.v2ph.com/album/a"]
+    tracker.close()
+
+
+def test_album_tracker_reopens_after_close(tmp_path):
+    log_path = tmp_path / "downloaded_albums.txt"
+    tracker = AlbumTracker(str(log_path))
+
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    tracker.close()
+    tracker.log_downloaded("https://www.v2ph.com/album/b")
+    tracker.close()
+    tracker.close()  # closing twice is harmless
+
+    assert read_log(log_path) == [
+        "https://www.v2ph.com/album/a",
+        "https://www.v2ph.com/album/b",
+    ]
+
+
+def test_album_tracker_loads_earlier_entries(tmp_path):
+    log_path = tmp_path / "downloaded_albums.txt"
+    tracker = AlbumTracker(str(log_path))
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    tracker.close()
+
+    tracker = AlbumTracker(str(log_path))
+    assert tracker.is_downloaded("https://www.v2ph.com/album/a")
+    assert not tracker.is_downloaded("https://www.v2ph.com/album/b")
+
+    tracker.log_downloaded("https://www.v2ph.com/album/a")
+    tracker.close()
+    assert read_log(log_path) == ["https://www.v2ph.com/album/a"]
+
+
+def test_file_exists_sees_written_files(tmp_path):
+    logger = logging.getLogger("test_logger")
+    cache = FolderCache()
+    folder = tmp_path / "album"
+    folder.mkdir()
+    (folder / "old.jpg").write_bytes(IMAGE)
+    new_file = PathUtil.get_file_path(tmp_path, "album", "new", "jpg", cache)
+
+    assert PathUtil.file_exists(folder / "old.jpg", False, logger, cache)
+    assert not PathUtil.file_exists(new_file, False, logger, cache)
+
+    Downloader.write_file(new_file, bytearray(IMAGE))
+    cache.record_file(new_file)
+    assert PathUtil.file_exists(new_file, False, logger, cache)
+
+    # no_skip never consults the cache
+    assert not PathUtil.file_exists(new_file, True, logger, cache)
+
+
+def test_file_exists_confirms_listed_files(tmp_path):
+    logger = logging.getLogger("test_logger")
+    cache = FolderCache()
+    file_path = PathUtil.get_file_path(tmp_path, "album", "image", "jpg", cache)
+    Downloader.write_file(file_path, bytearray(IMAGE))
+    cache.record_file(file_path)
+
+    file_path.unlink()
+    assert not PathUtil.file_exists(file_path, False, logger, cache)
+
+
+def test_folder_cache_shares_spellings(tmp_path, monkeypatch):
+    cache = FolderCache()
+    monkeypatch.chdir(tmp_path)
+    assert cache.list_folder(Path("album")) is cache.list_folder(tmp_path / "album")
+
+    cache.clear()
+    (tmp_path / "album" / "new.jpg").write_bytes(IMAGE)
+    assert cache.list_folder(tmp_path / "album") == {"new.jpg"}
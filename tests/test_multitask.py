@@ -0,0 +1,258 @@
+import time
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from v2dl.utils import AsyncService, RateLimiter, Task, ThreadingService
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("test_logger")
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Freeze time.monotonic and record the sleeps instead of waiting."""
+    clock = {"now": 1000.0, "sleeps": []}
+
+    def sleep(delay):
+        clock["sleeps"].append(delay)
+        clock["now"] += delay
+
+    monkeypatch.setattr(time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(time, "sleep", sleep)
+    return clock
+
+
+def sync_job(value, delay=0.0):
+    time.sleep(delay)
+    return value
+
+
+async def async_job(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+def failing_job():
+    raise ValueError("boom")
+
+
+async def async_failing_job():
+    raise ValueError("boom")
+
+
+def test_rate_limiter_burst(fake_clock):
+    limiter = RateLimiter(3, 15.0)
+
+    for _ in range(3):
+        limiter.acquire()
+    assert fake_clock["sleeps"] == []
+
+    limiter.acquire()
+    assert fake_clock["sleeps"] == [pytest.approx(5.0)]
+
+
+def test_rate_limiter_refill(fake_clock):
+    limiter = RateLimiter(2, 1.0)
+    limiter.acquire(2)
+
+    fake_clock["now"] += 0.25
+    limiter.acquire()
+    assert fake_clock["sleeps"] == [pytest.approx(0.25)]
+
+    # slow callers are never delayed
+    fake_clock["now"] += 10
+    limiter.acquire(2)
+    assert len(fake_clock["sleeps"]) == 1
+
+
+def test_rate_limiter_async(fake_clock, monkeypatch):
+    limiter = RateLimiter(1, 2.0)
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    async def run():
+        await limiter.acquire_async()
+        await limiter.acquire_async()
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    asyncio.run(run())
+    assert delays == [pytest.approx(2.0)]
+
+
+def test_per_host_limiter(logger):
+    service = AsyncService(logger, requests_per_second=2)
+
+    def make_task(url):
+        return Task(task_id=url, func=async_job, kwargs={"value": 1, "url": url})
+
+    first = service._get_limiter(make_task("https://a.example/1.jpg"))
+    assert first is not None
+    assert service._get_limiter(make_task("https://a.example/2.jpg")) is first
+    assert service._get_limiter(make_task("https://b.example/1.jpg")) is not first
+    assert service._get_limiter(Task(task_id="no_url", func=async_job)) is None
+
+    unlimited = AsyncService(logger)
+    assert unlimited._get_limiter(make_task("https://a.example/1.jpg")) is None
+
+
+@pytest.mark.parametrize("service_class", [ThreadingService, AsyncService])
+def test_add_stop_restart(service_class, logger):
+    job = async_job if service_class is AsyncService else sync_job
+    service = service_class(logger, max_workers=2)
+
+    service.add_tasks([Task(task_id=f"first_{i}", func=job, args=(i,)) for i in range(5)])
+    service.stop()
+    assert service.get_results() == {f"first_{i}": i for i in range(5)}
+    assert not service.is_running
+
+    service.add_task(Task(task_id="second", func=job, args=("again",)))
+    service.stop()
+    assert service.get_result("second") == "again"
+    assert service.get_result("second") is None
+
+
+@pytest.mark.parametrize("service_class", [ThreadingService, AsyncService])
+def test_results_after_error(service_class, logger, caplog):
+    is_async = service_class is AsyncService
+    service = service_class(logger, max_workers=2)
+
+    service.add_tasks(
+        [
+            Task(task_id="bad", func=async_failing_job if is_async else failing_job),
+            Task(task_id="good", func=async_job if is_async else sync_job, args=(1,)),
+        ],
+    )
+    service.stop()
+
+    results = service.get_results()
+    assert results["good"] == 1
+    assert results.get("bad") is None
+    assert "Error processing task bad" in caplog.text
+
+
+@pytest.mark.parametrize("max_results", [1, 2])
+def test_get_results_limit(logger, max_results):
+    service = ThreadingService(logger)
+    service.add_tasks([Task(task_id=str(i), func=sync_job, args=(i,)) for i in range(3)])
+    service.stop()
+
+    assert len(service.get_results(max_results)) == max_results
+    assert len(service.get_results()) == 3 - max_results
+
+
+def test_threading_cleanup_runs_once(logger):
+    service = ThreadingService(logger)
+    calls = []
+    service.add_cleanup(lambda: calls.append(1))
+
+    service.add_task(Task(task_id="a", func=sync_job, args=(1,)))
+    service.stop()
+    assert calls == [1]
+
+
+def test_async_cleanup_runs_once_per_loop(logger):
+    service = AsyncService(logger)
+    loops = []
+
+    async def cleanup():
+        loops.append(asyncio.get_running_loop())
+
+    service.add_cleanup(cleanup)
+
+    service.add_task(Task(task_id="a", func=async_job, args=(1,)))
+    service.stop()
+    assert len(loops) == 1
+
+    service.add_task(Task(task_id="b", func=async_job, args=(2,)))
+    service.stop()
+    assert len(loops) == 2
+    assert loops[0] is not loops[1]
+
+
+def test_threading_stop_timeout_defers_cleanup(logger):
+    service = ThreadingService(logger)
+    closed = threading.Event()
+    seen_closed = []
+
+    def job():
+        time.sleep(0.5)
+        seen_closed.append(closed.is_set())
+        return "done"
+
+    service.add_cleanup(closed.set)
+    service.add_task(Task(task_id="slow", func=job))
+    service.stop(timeout=0.05)
+    assert not closed.is_set()
+
+    assert closed.wait(5)
+    assert seen_closed == [False]
+    assert service.get_result("slow") == "done"
+
+
+def test_async_stop_timeout_then_restart(logger):
+    service = AsyncService(logger)
+    cleaned = []
+
+    async def cleanup():
+        cleaned.append(asyncio.get_running_loop())
+
+    service.add_cleanup(cleanup)
+
+    service.add_task(Task(task_id="slow", func=async_job, args=("s", 0.5)))
+    service.stop(timeout=0.05)
+    assert service.is_running  # the old loop is still draining
+
+    service.add_task(Task(task_id="fast", func=async_job, args=("f",)))
+    deadline = time.monotonic() + 5
+    while len(cleaned) < 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(cleaned) == 1
+    assert service.loop is not None  # the old loop did not clear the new one
+
+    service.stop()
+    assert len(cleaned) == 2
+    assert cleaned[0] is not cleaned[1]
+    assert service.get_results() == {"slow": "s", "fast": "f"}
+    assert not service.is_running
+
+
+class SlowHashKey(str):
+    """Task id that stalls the first dict store using it, widening the window of a racing read."""
+
+    def __hash__(self):
+        if not getattr(self, "stalled", False):
+            self.stalled = True
+            time.sleep(0.01)
+        return super().__hash__()
+
+
+@pytest.mark.parametrize("service_class", [ThreadingService, AsyncService])
+def test_get_results_while_tasks_complete(service_class, logger):
+    job = async_job if service_class is AsyncService else sync_job
+    service = service_class(logger, max_workers=4)
+    collected = {}
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            collected.update(service.get_results())
+            collected.update(service.get_results(3))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    service.add_tasks([Task(task_id=SlowHashKey(i), func=job, args=(i,)) for i in range(20)])
+    service.stop()
+    done.set()
+    thread.join()
+    collected.update(service.get_results())
+
+    assert collected == {str(i): i for i in range(20)}
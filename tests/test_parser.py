@@ -0,0 +1,24 @@
+import pytest
+
+from v2dl.utils import LinkParser
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.v2ph.com/album/abc",
+        "https://www.v2ph.com/album/abc?page=3",
+        "https://www.v2ph.com/actor/abc?page=2&hl=zh-Hant",
+        "https://www.v2ph.com/actor/abc?hl=zh-Hant&page=2&sort=new",
+        "https://example.com/search?q=a&q=b&sort=asc",
+        "https://example.com/search?q=a%20b&tag=%E4%B8%AD&page=1",
+        "https://example.com/search?q=a+b",
+        "https://example.com/path;params?q=test#results",
+        "https://example.com/path#fragment",
+        "https://example.com/path?",
+        "https://example.com",
+    ],
+)
+@pytest.mark.parametrize("page", [1, 2, 10])
+def test_page_url_builder_matches_add_page_num(url, page):
+    assert LinkParser.make_page_url_builder(url)(page) == LinkParser.add_page_num(url, page)
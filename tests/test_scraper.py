@@ -1,4 +1,5 @@
 import os
+import copy
 import shutil
 import logging
 from types import SimpleNamespace
@@ -14,9 +15,19 @@ from v2dl.utils import ServiceType
 from v2dl.web_bot import get_bot
 
 
+@pytest.fixture(scope="session")
+def session_base_config() -> BaseConfig:
+    return BaseConfigManager(DEFAULT_CONFIG).load()
+
+
+@pytest.fixture(scope="session")
+def logger() -> logging.Logger:
+    return setup_logging(logging.INFO, logger_name="pytest", archive=False)
+
+
 @pytest.fixture
-def base_config(tmp_path) -> BaseConfig:
-    base_config = BaseConfigManager(DEFAULT_CONFIG).load()
+def base_config(tmp_path, session_base_config) -> BaseConfig:
+    base_config = copy.deepcopy(session_base_config)
     base_config.paths.download_log = tmp_path / "download.log"
     base_config.download.download_dir = tmp_path / "Downloads"
     base_config.download.rate_limit = 1000
@@ -26,10 +37,9 @@ def base_config(tmp_path) -> BaseConfig:
 
 
 @pytest.fixture
-def setup_test_env(tmp_path, base_config):
+def setup_test_env(tmp_path, base_config, logger):
     def setup_env(service_type) -> tuple[ScrapeHandler, BaseConfig, RuntimeConfig]:
-        log_level = logging.INFO
-        logger = setup_logging(log_level, logger_name="pytest", archive=False)
+        log_level = logger.level
 
         args = SimpleNamespace(
             url="https://www.v2ph.com/album/Weekly-Big-Comic-Spirits-2016-No22-23",
@@ -118,5 +128,71 @@ def test_download_sync(setup_test_env, service_type):
         assert os.path.getsize(test_image) > 0, "Downloaded image is empty"
 
 
+class FakeBot:
+    """Serve canned pages by page number and record every load."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.loaded = []
+
+    def auto_page_scroll(self, url, page_sleep=0):
+        page = int(url.rpartition("page=")[2])
+        self.loaded.append(page)
+        return self.pages[page]
+
+
+def album_list_page(albums, last_page):
+    covers = "".join(
+        f'<a class="media-cover" href="/album/{album}">{album}</a>' for album in albums
+    )
+    pagination = "".join(
+        f'<li class="page-item"><a class="page-link" href="?page={page}">{page}</a></li>'
+        for page in range(1, last_page + 1)
+    )
+    return f"<html><body>{covers}<ul>{pagination}</ul></body></html>"
+
+
+@pytest.mark.parametrize(
+    ("pages", "expected_albums", "expected_loads"),
+    [
+        # each page lists the next one, the last one ends the scrape
+        ({1: album_list_page(["a"], 2), 2: album_list_page(["b"], 2)}, ["a", "b"], [1, 2]),
+        # page 2 is empty although page 1 lists page 3, page 3 must not be loaded
+        (
+            {1: album_list_page(["a"], 3), 2: album_list_page([], 3), 3: album_list_page(["c"], 3)},
+            ["a"],
+            [1, 2],
+        ),
+    ],
+)
+def test_real_scrape_prefetches_listed_pages_only(
+    base_config,
+    logger,
+    pages,
+    expected_albums,
+    expected_loads,
+):
+    args = SimpleNamespace(
+        concurrency=1,
+        no_skip=False,
+        url="https://www.v2ph.com/actor/abc",
+        input_file="",
+        bot_type="drission",
+        chrome_args=[],
+        user_agent=None,
+        terminate=True,
+        use_default_chrome_profile=False,
+        dry_run=True,
+    )
+    runtime_config = create_runtime_config(args, base_config, logger, logger.level)  # type: ignore
+    web_bot = FakeBot(pages)
+    scraper = ScrapeHandler(runtime_config, base_config, web_bot)
+
+    albums = scraper._real_scrape(runtime_config.url, 1, "album_list")
+
+    assert albums == [f"https://www.v2ph.com/album/{album}" for album in expected_albums]
+    assert web_bot.loaded == expected_loads
+
+
 if __name__ == "__main__":
     pytest.main(["-v", __file__])
@@ -1,3 +1,4 @@
+import os
 import atexit
 import base64
 import shutil
@@ -5,11 +6,15 @@ import logging
 import secrets
 from datetime import datetime, timedelta
 
+import yaml
 import pytest
+from dotenv import dotenv_values
 from nacl.public import PrivateKey
+from nacl.secret import SecretBox
 
 from v2dl.common import EncryptionConfig, SecurityError
-from v2dl.utils import AccountManager, Encryptor, KeyManager
+from v2dl.utils import AccountManager, Encryptor, KeyManager, SecureFileHandler
+from v2dl.utils.security import cleanup
 
 
 @pytest.fixture
@@ -37,17 +42,33 @@ def encryptor(encryption_config, logger):
 
 def test_master_key_decryption(encryptor: Encryptor):
     master_key = secrets.token_bytes(32)
-    encrypted_key, salt, encryption_key = encryptor.encrypt_master_key(master_key)
+    encrypted_key, encryption_key = encryptor.encrypt_master_key(master_key)
 
     decrypted_key = encryptor.decrypt_master_key(
         encrypted_master_key=encrypted_key,
-        salt=base64.b64encode(salt).decode("utf-8"),
         encryption_key=base64.b64encode(encryption_key).decode("utf-8"),
     )
 
     assert decrypted_key == master_key, "master key decryption error"
 
 
+def test_legacy_master_key_decryption(encryptor: Encryptor):
+    # key stores created before the KDF was removed keep a salt in .env
+    master_key = secrets.token_bytes(32)
+    salt = secrets.token_bytes(16)
+    encryption_key = secrets.token_bytes(32)
+    box = SecretBox(encryptor.derive_key(encryption_key, salt))
+    encrypted_key = box.encrypt(master_key)
+
+    decrypted_key = encryptor.decrypt_master_key(
+        encrypted_master_key=encrypted_key,
+        encryption_key=base64.b64encode(encryption_key).decode("utf-8"),
+        salt=base64.b64encode(salt).decode("utf-8"),
+    )
+
+    assert decrypted_key == master_key, "legacy master key decryption error"
+
+
 def test_keypair(encryptor: Encryptor):
     test_message = "test message."
 
@@ -88,7 +109,7 @@ def account_manager(encryption_config, logger, tmp_path):
 
     yield account_manager_instance
 
-    atexit.unregister(account_manager_instance._save_yaml)
+    atexit.unregister(account_manager_instance.save)
     shutil.rmtree(tmp_path)
 
 
@@ -153,6 +174,32 @@ def test_update_status(account_manager: AccountManager):
     assert account["exceed_time"] != ""
 
 
+def test_save(account_manager: AccountManager):
+    username = "test_user"
+    private_key = PrivateKey.generate()
+    public_key = private_key.public_key
+
+    account_manager.create(username, "test_password", "", public_key)
+    account_manager.update_account(username, "exceed_quota", True)
+    with open(account_manager.yaml_path) as f:
+        assert yaml.safe_load(f)[username]["exceed_quota"] is True
+
+    account_manager.edit(public_key, username, None, "new_password", "new_cookies")
+    with open(account_manager.yaml_path) as f:
+        saved = yaml.safe_load(f)[username]
+    assert saved["cookies"] == "new_cookies"
+    assert "password_mac" not in saved
+
+    # the mac backfill is a background update, written by save()
+    assert account_manager.verify_password(username, "new_password", private_key)
+    with open(account_manager.yaml_path) as f:
+        assert "password_mac" not in yaml.safe_load(f)[username]
+
+    account_manager.save()
+    with open(account_manager.yaml_path) as f:
+        assert "password_mac" in yaml.safe_load(f)[username]
+
+
 def test_verify_password(account_manager: AccountManager):
     username = "test_user"
     password = "test_password"
@@ -164,6 +211,17 @@ def test_verify_password(account_manager: AccountManager):
     assert account_manager.verify_password(username, password, private_key) is True
     assert account_manager.verify_password(username, "wrong_password", private_key) is False
 
+    # the first successful check stores a mac which is used afterwards
+    assert "password_mac" in account_manager.accounts[username]
+    assert account_manager.verify_password(username, password, private_key) is True
+    assert account_manager.verify_password(username, "wrong_password", private_key) is False
+
+    # changing the password invalidates the mac
+    account_manager.edit(public_key, username, None, "new_password", None)
+    assert "password_mac" not in account_manager.accounts[username]
+    assert account_manager.verify_password(username, "new_password", private_key) is True
+    assert account_manager.verify_password(username, password, private_key) is False
+
 
 def test_check(account_manager: AccountManager):
     username = "test_user"
@@ -183,3 +241,52 @@ def test_check(account_manager: AccountManager):
     assert account is not None
     assert account["exceed_quota"] is False
     assert account["exceed_time"] == ""
+
+
+def test_cleanup():
+    buffers = [bytearray(secrets.token_bytes(32)), bytearray()]
+    master_key = buffers[0]
+
+    cleanup(buffers)
+
+    assert master_key == bytearray(32)
+
+
+def test_update_env(tmp_path, monkeypatch):
+    env_path = tmp_path / ".env"
+    env_path.write_text("OTHER='keep'\nSALT='old'\nENCRYPTION_KEY='old'\n")
+    monkeypatch.setenv("SALT", "old")
+    monkeypatch.setenv("ENCRYPTION_KEY", "old")
+
+    SecureFileHandler.update_env(str(env_path), {"ENCRYPTION_KEY": b"new", "SALT": None})
+
+    expected_key = base64.b64encode(b"new").decode("utf-8")
+    assert env_path.read_text() == f"OTHER='keep'\nENCRYPTION_KEY='{expected_key}'\n"
+    assert os.environ["ENCRYPTION_KEY"] == expected_key
+    assert "SALT" not in os.environ
+
+
+def test_legacy_key_store_migration(encryption_config, logger, tmp_path, monkeypatch):
+    monkeypatch.delenv("SALT", raising=False)
+    monkeypatch.delenv("ENCRYPTION_KEY", raising=False)
+    path_config = {
+        "key_folder": str(tmp_path / ".keys"),
+        "env_path": str(tmp_path / ".env"),
+        "master_key_file": str(tmp_path / ".keys" / "master_key.enc"),
+        "private_key_file": str(tmp_path / ".keys" / "private_key.pem"),
+        "public_key_file": str(tmp_path / ".keys" / "public_key.pem"),
+    }
+    key_manager = KeyManager(logger, encryption_config, path_config)
+    master_key = key_manager.load_master_key()
+
+    # rewrite the key store the way older versions saved it
+    salt = secrets.token_bytes(16)
+    encryption_key = base64.b64decode(os.environ["ENCRYPTION_KEY"])
+    legacy_master_key = SecretBox(key_manager.derive_key(encryption_key, salt)).encrypt(master_key)
+    SecureFileHandler.write_file(path_config["master_key_file"], legacy_master_key)
+    SecureFileHandler.write_env(path_config["env_path"], "SALT", salt)
+
+    key_manager.load_keys()
+
+    assert "SALT" not in dotenv_values(path_config["env_path"])
+    assert key_manager.load_master_key() == master_key
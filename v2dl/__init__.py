@@ -5,14 +5,35 @@ if sys.version_info < (3, 10):
         "You are using an unsupported version of Python. Only Python versions 3.10 and above are supported by v2dl",
     )
 
+import os
 import sys
 import logging
 from argparse import Namespace as NamespaceT
+from collections.abc import Callable
+from typing import Any
 
 from . import cli, common, core, utils, version, web_bot
 
 __all__ = ["cli", "common", "core", "utils", "version", "version", "web_bot"]
 
+# download API methods that each task service runs, selected as bound methods so they stay typed
+_MethodSelector = Callable[[utils.BaseDownloadAPI], Callable[..., Any]]
+_DOWNLOAD_FUNCTION: dict[utils.ServiceType, _MethodSelector] = {
+    utils.ServiceType.THREADING: lambda api: api.download,
+    utils.ServiceType.ASYNC: lambda api: api.download_async,
+}
+_CLOSE_FUNCTION: dict[utils.ServiceType, _MethodSelector] = {
+    utils.ServiceType.THREADING: lambda api: api.close,
+    utils.ServiceType.ASYNC: lambda api: api.aclose,
+}
+
+
+def default_max_workers(service_type: utils.ServiceType) -> int:
+    """Download concurrency used when --concurrency is not given."""
+    if service_type == utils.ServiceType.THREADING:
+        return min(32, (os.cpu_count() or 4) * 4)
+    return 16
+
 
 def process_input(args: NamespaceT) -> common._types.BaseConfig:
     if args.version:
@@ -45,15 +66,16 @@ def create_runtime_config(
     base_config: common.BaseConfig,
     logger: logging.Logger,
     log_level: int,
-    service_type: utils.ServiceType = utils.ServiceType.THREADING,
+    service_type: utils.ServiceType = utils.ServiceType.ASYNC,
 ) -> common.RuntimeConfig:
     """Create runtime configuration with integrated download service and function."""
 
-    service_type = utils.ServiceType.THREADING
+    max_workers = args.concurrency or default_max_workers(service_type)
     download_service = utils.TaskServiceFactory.create(
         service_type=service_type,
         logger=logger,
-        max_workers=args.concurrency,
+        max_workers=max_workers,
+        requests_per_second=base_config.download.requests_per_second,
     )
 
     download_api = utils.DownloadAPIFactory.create(
@@ -62,14 +84,12 @@ def create_runtime_config(
         rate_limit=base_config.download.rate_limit,
         no_skip=args.no_skip,
         logger=logger,
+        max_connections=max_workers,
     )
 
-    download_function = (
-        download_api.download_async
-        if service_type == utils.ServiceType.ASYNC
-        else download_api.download
-    )
+    download_function = _DOWNLOAD_FUNCTION[service_type](download_api)
     logger.debug("using download function name: %s", download_function.__name__)
+    download_service.add_cleanup(_CLOSE_FUNCTION[service_type](download_api))
 
     return common.RuntimeConfig(
         url=args.url,
@@ -2,20 +2,26 @@ import os
 import sys
 import getpass
 import logging
-import platform
 from collections import OrderedDict
 from collections.abc import Callable
 from dataclasses import dataclass
 from enum import Enum
+from types import ModuleType
 from typing import Any
 
-import questionary
-
 from ..common import EncryptionConfig
+from ..common.const import USER_OS
 from ..utils import AccountManager, KeyManager
 from ..version import __package_name__
 
 
+def _questionary() -> ModuleType:
+    """Import questionary on first use, prompt_toolkit is slow to import and only the menu needs it."""
+    import questionary  # noqa: PLC0415
+
+    return questionary
+
+
 class MenuAction(Enum):
     CREATE = "create"
     READ = "read"
@@ -75,7 +81,7 @@ class AccountManagerCLI:
         os.system("cls" if os.name == "nt" else "clear")  # nosec
 
     def get_pass(self, prompt: str = "Password: ") -> str:
-        if platform.system() == "Windows":
+        if USER_OS == "Windows":
             return input(prompt)
         return getpass.getpass(prompt)
 
@@ -91,6 +97,7 @@ class AccountManagerCLI:
         ]
 
     def display_menu(self) -> Any:
+        questionary = _questionary()
         return questionary.select(self.strings.menu_prompt, choices=self.get_menu_choices()).ask()
 
     def create_account(self) -> None:
@@ -142,6 +149,7 @@ class AccountManagerCLI:
             if not self.account_manager.verify_password(username, password, self.private_key):
                 return
 
+            questionary = _questionary()
             confirm_delete = questionary.select(
                 self.strings.confirm_delete.format(username=username),
                 choices=[
@@ -41,6 +41,7 @@ class DownloadConfig:
     max_scroll_step: int
     rate_limit: int
     download_dir: str
+    requests_per_second: float = 0
 
 
 @dataclass
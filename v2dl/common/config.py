@@ -1,5 +1,5 @@
 import os
-import platform
+import functools
 from pathlib import Path
 from typing import Any
 
@@ -7,6 +7,7 @@ import yaml
 from dotenv import load_dotenv
 
 from ._types import BaseConfig, ChromeConfig, DownloadConfig, EncryptionConfig, PathConfig
+from .const import USER_OS
 
 
 class PathTool:
@@ -17,15 +18,17 @@ class PathTool:
         return os.path.join(base_dir, path) if not os.path.isabs(path) else path
 
     @staticmethod
+    @functools.cache
     def get_system_config_dir() -> Path:
-        """Return the config directory."""
-        if platform.system() == "Windows":
+        """Return the config directory, resolved once per process."""
+        if USER_OS == "Windows":
             base = os.getenv("APPDATA", "")
         else:
             base = os.path.expanduser("~/.config")
         return Path(base) / "v2dl"
 
     @staticmethod
+    @functools.cache
     def get_default_download_dir() -> Path:
         return Path.home() / "Downloads"
 
@@ -41,7 +44,7 @@ class PathTool:
 
     @staticmethod
     def get_chrome_exec_path(config_data: dict[str, Any]) -> str:
-        current_os = platform.system()
+        current_os = USER_OS
         exec_path = config_data["chrome"]["exec_path"].get(current_os)
         if not exec_path:
             raise ValueError(f"Unsupported OS: {current_os}")
@@ -117,10 +120,13 @@ class BaseConfigManager(PathTool):
 
     @staticmethod
     def _merge_config(base: dict[str, Any], custom: dict[str, Any]) -> dict[str, Any]:
-        """Recursively merge custom config into base config."""
-        for key, value in custom.items():
-            if isinstance(value, dict) and key in base:
-                BaseConfigManager._merge_config(base[key], value)
-            else:
-                base[key] = value
+        """Merge custom config into base config, nested dicts are merged key by key."""
+        stack = [(base, custom)]
+        while stack:
+            base_section, custom_section = stack.pop()
+            for key, value in custom_section.items():
+                if isinstance(value, dict) and isinstance(base_section.get(key), dict):
+                    stack.append((base_section[key], value))
+                else:
+                    base_section[key] = value
         return base
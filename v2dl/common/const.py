@@ -10,6 +10,7 @@ DEFAULT_CONFIG: dict[str, dict[str, Any]] = {
         "max_scroll_step": 500,
         "rate_limit": 400,
         "download_dir": "v2dl",
+        "requests_per_second": 0,
     },
     "paths": {
         "download_log": "downloaded_albums.txt",
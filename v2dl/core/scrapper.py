@@ -1,13 +1,13 @@
 import re
-import time
 from abc import ABC, abstractmethod
-from typing import Any, ClassVar, Generic, Literal, TypeAlias, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, ClassVar, Generic, Literal, TypeAlias, TypeVar, overload
 
-from lxml import html
+from lxml import etree, html
 
 from ..common import BaseConfig, RuntimeConfig, ScrapeError
 from ..common.const import BASE_URL
-from ..utils import AlbumTracker, LinkParser, Task
+from ..utils import AlbumTracker, LinkParser, RateLimiter, Task
 
 # Manage return types of each scraper here
 AlbumLink: TypeAlias = str
@@ -15,6 +15,9 @@ ImageLinkAndALT: TypeAlias = tuple[str, str]
 LinkType = TypeVar("LinkType", AlbumLink, ImageLinkAndALT)
 ScrapeType = Literal["album_list", "album_image"]
 
+_ALBUM_NAME_INDEX = re.compile(r"\s*\d+$")
+_ALBUM_NAME_TAIL = re.compile(r"\s*\d*$")
+
 
 class ScrapeManager:
     """Manage the starting and ending of the scraper."""
@@ -70,6 +73,11 @@ class ScrapeHandler:
         "country": "album_list",
     }
 
+    # Page loads of a single scrape are limited to bursts of MAX_CONSECUTIVE_PAGE pages and
+    # MAX_CONSECUTIVE_PAGE pages per CONSECUTIVE_SLEEP seconds on average.
+    MAX_CONSECUTIVE_PAGE = 3
+    CONSECUTIVE_SLEEP = 15.0
+
     def __init__(
         self,
         runtime_config: RuntimeConfig,
@@ -101,10 +109,13 @@ class ScrapeHandler:
     def scrape(self, url: str, dry_run: bool = False) -> None:
         """Main entry point for scraping operations."""
         scrape_type = self._get_scrape_type()
-        if scrape_type == "album_list":
-            self.scrape_album_list(url, self.start_page, dry_run)
-        else:
-            self.scrape_album(url, self.start_page, dry_run)
+        try:
+            if scrape_type == "album_list":
+                self.scrape_album_list(url, self.start_page, dry_run)
+            else:
+                self.scrape_album(url, self.start_page, dry_run)
+        finally:
+            self.album_tracker.close()
 
     def scrape_album_list(self, url: str, start_page: int, dry_run: bool) -> None:
         """Handle scraping of album lists."""
@@ -127,7 +138,7 @@ class ScrapeHandler:
         if not image_links:
             return
 
-        album_name = re.sub(r"\s*\d+$", "", image_links[0][1])
+        album_name = _ALBUM_NAME_INDEX.sub("", image_links[0][1])
         self.logger.info("Found %d images in album %s", len(image_links), album_name)
 
         if dry_run:
@@ -135,6 +146,8 @@ class ScrapeHandler:
                 self.logger.info("[DRY RUN] Image URL: %s", link)
         else:
             self.album_tracker.log_downloaded(album_url)
+            # checkpoint per album, a crash during a long album list keeps the finished ones
+            self.album_tracker.flush()
 
     def _scrape_single_page(
         self,
@@ -157,14 +170,63 @@ class ScrapeHandler:
             - bool: A flag indicating whether to continue to the next page.
         """
         full_url = LinkParser.add_page_num(url, page)
-        html_content = self.web_bot.auto_page_scroll(full_url, page_sleep=0)
+        html_content = self._fetch_page(full_url)
+        page_result, max_page = self._parse_page(
+            html_content,
+            full_url,
+            page,
+            strategy,
+            scrape_type,
+        )
+        return page_result, page < max_page
+
+    def _fetch_page(self, full_url: str) -> str:
+        """Load a page with the web bot, must be called from the thread owning the browser."""
+        return self.web_bot.auto_page_scroll(full_url, page_sleep=0)
+
+    def _parse_page(
+        self,
+        html_content: str,
+        full_url: str,
+        page: int,
+        strategy: "BaseScraper[Any]",
+        scrape_type: ScrapeType,
+    ) -> tuple[list[AlbumLink] | list[ImageLinkAndALT], int]:
+        """Extracts the links of a fetched page.
+
+        Returns:
+            tuple[list[AlbumLink] | list[ImageLinkAndALT], int]: The links of the page and the last
+            page number from the pagination, 0 if there is nothing left to scrape.
+        """
+        page_data = self._read_page(html_content, full_url, page, strategy, scrape_type)
+        if page_data is None:
+            return [], 0
+
+        tree, page_links, max_page = page_data
+        return self._process_page(strategy, page_links, tree, page), max_page
+
+    def _read_page(
+        self,
+        html_content: str,
+        full_url: str,
+        page: int,
+        strategy: "BaseScraper[Any]",
+        scrape_type: ScrapeType,
+    ) -> tuple[html.HtmlElement, list[Any], int] | None:
+        """Parses a fetched page and reads its pagination, without processing the links.
+
+        Returns:
+            tuple[html.HtmlElement, list[Any], int] | None: The tree, the nodes matched by the
+            strategy and the last page number from the pagination, None if there is nothing to
+            scrape on this page.
+        """
         tree = LinkParser.parse_html(html_content, self.logger)
 
         if tree is None:
-            return [], False
+            return None
 
         self.logger.info("Fetching content from %s", full_url)
-        page_links = tree.xpath(strategy.get_xpath())
+        page_links = strategy.get_xpath()(tree)
 
         if not page_links:
             self.logger.info(
@@ -172,17 +234,44 @@ class ScrapeHandler:
                 "albums" if scrape_type == "album_list" else "images",
                 page,
             )
-            return [], False
+            return None
+
+        # Check if we've reached the last page
+        max_page = LinkParser.get_max_page(tree)
+        if page >= max_page:
+            self.logger.info("Reach last page, stopping")
+
+        return tree, page_links, max_page
 
+    def _process_page(
+        self,
+        strategy: "BaseScraper[Any]",
+        page_links: list[Any],
+        tree: html.HtmlElement,
+        page: int,
+    ) -> list[AlbumLink] | list[ImageLinkAndALT]:
+        """Extracts the links from the nodes found by _read_page."""
         page_result: list[AlbumLink] | list[ImageLinkAndALT] = []
         strategy.process_page_links(page_links, page_result, tree, page)
+        return page_result
 
-        # Check if we've reached the last page
-        should_continue = page < LinkParser.get_max_page(tree)
-        if not should_continue:
-            self.logger.info("Reach last page, stopping")
+    @overload
+    def _real_scrape(
+        self,
+        url: str,
+        start_page: int,
+        scrape_type: Literal["album_list"],
+        **kwargs: dict[Any, Any],
+    ) -> list[AlbumLink]: ...
 
-        return page_result, should_continue
+    @overload
+    def _real_scrape(
+        self,
+        url: str,
+        start_page: int,
+        scrape_type: Literal["album_image"],
+        **kwargs: dict[Any, Any],
+    ) -> list[ImageLinkAndALT]: ...
 
     def _real_scrape(
         self,
@@ -190,9 +279,14 @@ class ScrapeHandler:
         start_page: int,
         scrape_type: ScrapeType,
         **kwargs: dict[Any, Any],
-    ) -> list[Any]:
+    ) -> list[AlbumLink] | list[ImageLinkAndALT]:
         """Scrapes pages for links using the specified scraping strategy.
 
+        The browser loads one page at a time, so pages are fetched serially. The pagination of the
+        current page is read first, and only when it lists a next page is that page loaded while a
+        worker thread processes the links of the current one and queues their downloads. No page is
+        loaded, and no throttling token spent, past the last page or an empty one.
+
         Args:
             url (str): The URL to scrape.
             start_page (int): The starting page number for the scraping process.
@@ -200,7 +294,8 @@ class ScrapeHandler:
             **kwargs (dict[Any, Any]): Additional keyword arguments for custom behavior.
 
         Returns:
-            list[Any]: A list of results extracted from all scraped pages.
+            list[AlbumLink] | list[ImageLinkAndALT]: The links extracted from all scraped pages,
+            album URLs for "album_list" and (url, alt) pairs for "album_image".
 
         Raises:
             KeyError: If the provided scrape_type is not found in the strategies.
@@ -214,34 +309,36 @@ class ScrapeHandler:
 
         all_results: list[Any] = []
         page = start_page
+        page_url = LinkParser.make_page_url_builder(url)
+        page_limiter = RateLimiter(self.MAX_CONSECUTIVE_PAGE, self.CONSECUTIVE_SLEEP)
+        read_page = self._read_page
+        process_page = self._process_page
+        fetch_page = self._fetch_page
 
-        while True:
-            page_results, should_continue = self._scrape_single_page(
-                url,
-                page,
-                strategy,
-                scrape_type,
-            )
-            all_results.extend(page_results)
+        def fetch(page: int) -> str:
+            page_limiter.acquire()
+            return fetch_page(page_url(page))
 
-            if not should_continue:
-                break
+        html_content = fetch(page)
 
-            page = self._handle_pagination(page)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="v2dl-parse") as executor:
+            while True:
+                page_data = read_page(html_content, page_url(page), page, strategy, scrape_type)
+                if page_data is None:
+                    break
 
-        return all_results
+                tree, page_links, max_page = page_data
+                future = executor.submit(process_page, strategy, page_links, tree, page)
 
-    def _handle_pagination(
-        self,
-        current_page: int,
-        max_consecutive_page: int = 3,
-        consecutive_sleep: int = 15,
-    ) -> int:
-        """Handle pagination logic including sleep for consecutive pages."""
-        next_page = current_page + 1
-        if next_page % max_consecutive_page == 0:
-            time.sleep(consecutive_sleep)
-        return next_page
+                # this page's own pagination decides on the next load, so it is never wasted
+                next_html = fetch(page + 1) if page < max_page else None
+                all_results.extend(future.result())
+
+                if next_html is None:
+                    break
+                page, html_content = page + 1, next_html
+
+        return all_results
 
     def _get_scrape_type(self) -> ScrapeType:
         """Get the appropriate handler method based on URL path."""
@@ -268,27 +365,27 @@ class BaseScraper(Generic[LinkType], ABC):
         self.logger = runtime_config.logger
 
     @abstractmethod
-    def get_xpath(self) -> str:
-        """Return xpath for the specific strategy."""
+    def get_xpath(self) -> etree.XPath:
+        """Return the compiled xpath for the specific strategy."""
 
     @abstractmethod
     def process_page_links(
         self,
-        page_links: list[str],
+        page_links: list[Any],
         page_result: list[LinkType],
         tree: html.HtmlElement,
         page: int,
         **kwargs: dict[Any, Any],
     ) -> None:
-        """Process links found on the page."""
+        """Process the nodes matched by get_xpath() on the page."""
 
 
 class AlbumScraper(BaseScraper[AlbumLink]):
     """Strategy for scraping album list pages."""
 
-    XPATH_ALBUM_LIST = '//a[@class="media-cover"]/@href'
+    XPATH_ALBUM_LIST = etree.XPath('//a[@class="media-cover"]/@href')
 
-    def get_xpath(self) -> str:
+    def get_xpath(self) -> etree.XPath:
         return self.XPATH_ALBUM_LIST
 
     def process_page_links(
@@ -299,15 +396,15 @@ class AlbumScraper(BaseScraper[AlbumLink]):
         page: int,
         **kwargs: dict[Any, Any],
     ) -> None:
-        page_result.extend([BASE_URL + album_link for album_link in page_links])
+        page_result.extend(map(BASE_URL.__add__, page_links))
         self.logger.info("Found %d albums on page %d", len(page_links), page)
 
 
 class ImageScraper(BaseScraper[ImageLinkAndALT]):
     """Strategy for scraping album image pages."""
 
-    XPATH_ALBUM = '//div[@class="album-photo my-2"]/img/@data-src'
-    XPATH_ALTS = '//div[@class="album-photo my-2"]/img/@alt'
+    # the image elements, their links and alts are read in the same pass
+    XPATH_ALBUM = etree.XPath('//div[@class="album-photo my-2"]/img[@data-src]')
 
     def __init__(
         self,
@@ -321,53 +418,61 @@ class ImageScraper(BaseScraper[ImageLinkAndALT]):
         self.download_function = download_function
         self.alt_counter = 0
 
-    def get_xpath(self) -> str:
+    def get_xpath(self) -> etree.XPath:
         return self.XPATH_ALBUM
 
     def process_page_links(
         self,
-        page_links: list[str],
+        page_links: list[html.HtmlElement],
         page_result: list[ImageLinkAndALT],
         tree: html.HtmlElement,
         page: int,
         **kwargs: dict[Any, Any],
     ) -> None:
-        alts: list[str] = tree.xpath(self.XPATH_ALTS)
-
-        # Handle missing alt texts
-        if len(alts) < len(page_links):
-            missing_alts = [str(i + self.alt_counter) for i in range(len(page_links) - len(alts))]
-            alts.extend(missing_alts)
-            self.alt_counter += len(missing_alts)
-
-        page_result.extend(zip(page_links, alts, strict=False))
+        image_links: list[ImageLinkAndALT] = []
+        alts: list[str] = []
+        for img in page_links:
+            alt = img.get("alt")
+            # Handle missing alt texts
+            if alt is None:
+                alt = str(self.alt_counter)
+                self.alt_counter += 1
+            image_links.append((img.get("data-src"), alt))
+            alts.append(alt)
+        page_result.extend(image_links)
 
         # Handle downloads if not in dry run mode
         if not self.dry_run:
             album_name = extract_album_name(alts)
 
             # assign download job for each image
-            for i, (url, alt) in enumerate(zip(page_links, alts, strict=False)):
+            download_function = self.download_function
+            download_dir = self.base_config.download.download_dir
+            tasks = []
+            for i, (url, alt) in enumerate(image_links):
                 task_id = f"{album_name}_{i}"
                 task = Task(
                     task_id=task_id,
-                    func=self.download_function,
+                    func=download_function,
                     kwargs={
                         "album_name": task_id,
                         "url": url,
                         "alt": alt,
-                        "base_folder": self.base_config.download.download_dir,
+                        "base_folder": download_dir,
                     },
                 )
-                self.download_service.add_task(task)
+                tasks.append(task)
+            self.download_service.add_tasks(tasks)
 
         self.logger.info("Found %d images on page %d", len(page_links), page)
 
 
 def extract_album_name(alts: list[str]) -> str:
-    album_name = next((alt for alt in alts if not alt.isdigit()), None)
-    if album_name:
-        album_name = re.sub(r"\s*\d*$", "", album_name).strip()
+    album_name = None
+    for alt in alts:
+        if not alt.isdigit():
+            album_name = _ALBUM_NAME_TAIL.sub("", alt).strip()
+            break
     if not album_name:
         album_name = BASE_URL.rstrip("/").split("/")[-1]
     return album_name
@@ -4,6 +4,7 @@ from .factory import DownloadAPIFactory, ServiceType, TaskServiceFactory
 from .multitask import (
     AsyncService,
     BaseTaskService,
+    RateLimiter,
     Task,
     ThreadingService,
 )
@@ -23,6 +24,7 @@ __all__ = [
     "KeyManager",
     "LinkParser",
     "PathUtil",
+    "RateLimiter",
     "SecureFileHandler",
     "ServiceType",
     "Task",
@@ -1,20 +1,30 @@
 import os
-import re
 import sys
 import time
 import asyncio
 import logging
+import threading
+import importlib.util
 from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from typing import TextIO
 
 import httpx
 from pathvalidate import sanitize_filename
 from requests import Response
 
+from .multitask import RateLimiter
 from .parser import LinkParser
 
 logger = logging.getLogger()
 
+# multiplex the downloads over fewer connections when the h2 package (httpx[http2]) is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_EXT_ALLOW = frozenset({"jpg", "jpeg", "png", "gif", "bmp", "webp", "tiff", "svg"})
+
 
 class BaseDownloadAPI(ABC):
     """Base protocol for download APIs."""
@@ -25,11 +35,63 @@ class BaseDownloadAPI(ABC):
         rate_limit: int,
         no_skip: bool,
         logger: logging.Logger,
+        max_connections: int = 64,
     ):
         self.headers = headers
         self.rate_limit = rate_limit
         self.no_skip = no_skip
         self.logger = logger
+        self.limits = Downloader.connection_limits(max_connections)
+        self._client: httpx.Client | None = None
+        self._client_lock = threading.Lock()
+        # an AsyncClient only works on the loop it was used on, so each loop gets its own
+        self._async_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self.folder_cache = FolderCache()
+
+    @property
+    def client(self) -> httpx.Client:
+        """Connection pool shared by all download threads."""
+        with self._client_lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=Downloader.TIMEOUT,
+                    limits=self.limits,
+                    http2=HTTP2_AVAILABLE,
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Connection pool shared by all downloads of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._client_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    timeout=Downloader.ASYNC_TIMEOUT,
+                    limits=self.limits,
+                    http2=HTTP2_AVAILABLE,
+                )
+            return client
+
+    def close(self) -> None:
+        """Close the connections of the threaded downloads and forget the folder listings."""
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+        self.folder_cache.clear()
+
+    async def aclose(self) -> None:
+        """Close the connections of the async downloads of the running event loop.
+
+        The folder listings are forgotten as well.
+        """
+        with self._client_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        self.folder_cache.clear()
+        if client is not None:
+            await client.aclose()
 
     @abstractmethod
     def download(self, album_name: str, url: str, alt: str, base_folder: Path) -> bool:
@@ -46,14 +108,22 @@ class ImageDownloadAPI(BaseDownloadAPI):
     """Image download implementation."""
 
     def download(self, album_name: str, url: str, alt: str, base_folder: Path) -> bool:
+        album_name = album_name.rsplit("_", 1)[0]
         try:
             extension = PathUtil.get_image_extension(url)
-            file_path = PathUtil.get_file_path(base_folder, album_name, alt, extension)
-
-            if PathUtil.file_exists(file_path, self.no_skip, self.logger):
+            file_path = PathUtil.get_file_path(
+                base_folder,
+                album_name,
+                alt,
+                extension,
+                self.folder_cache,
+            )
+
+            if PathUtil.file_exists(file_path, self.no_skip, self.logger, self.folder_cache):
                 return True
 
-            Downloader.download(url, file_path, self.headers, self.rate_limit)
+            Downloader.download(url, file_path, self.headers, self.rate_limit, self.client)
+            self.folder_cache.record_file(file_path)
             self.logger.info("Downloaded: '%s'", file_path)
             return True
         except Exception as e:
@@ -61,15 +131,49 @@ class ImageDownloadAPI(BaseDownloadAPI):
             return False
 
     async def download_async(self, album_name: str, url: str, alt: str, base_folder: Path) -> bool:
+        album_name = album_name.rsplit("_", 1)[0]
+        return await self._download_async(album_name, url, alt, base_folder, self.async_client)
+
+    async def download_many(
+        self,
+        album_name: str,
+        links: list[tuple[str, str]],
+        base_folder: Path,
+        max_concurrency: int = 16,
+    ) -> list[bool]:
+        """Download the (url, alt) pairs of an album concurrently over one connection pool."""
+        sem = asyncio.Semaphore(max_concurrency)
+        client = self.async_client
+
+        async def download_one(url: str, alt: str) -> bool:
+            async with sem:
+                return await self._download_async(album_name, url, alt, base_folder, client)
+
+        return await asyncio.gather(*(download_one(url, alt) for url, alt in links))
+
+    async def _download_async(
+        self,
+        album_name: str,
+        url: str,
+        alt: str,
+        base_folder: Path,
+        client: httpx.AsyncClient | None = None,
+    ) -> bool:
         try:
-            album_name = album_name.rsplit("_", 1)[0]
             extension = PathUtil.get_image_extension(url)
-            file_path = PathUtil.get_file_path(base_folder, album_name, alt, extension)
-
-            if PathUtil.file_exists(file_path, self.no_skip, self.logger):
+            file_path = PathUtil.get_file_path(
+                base_folder,
+                album_name,
+                alt,
+                extension,
+                self.folder_cache,
+            )
+
+            if PathUtil.file_exists(file_path, self.no_skip, self.logger, self.folder_cache):
                 return True
 
-            await Downloader.download_async(url, file_path, self.headers, self.rate_limit)
+            await Downloader.download_async(url, file_path, self.headers, self.rate_limit, client)
+            self.folder_cache.record_file(file_path)
             self.logger.info("Downloaded: '%s'", file_path)
             return True
         except Exception as e:
@@ -106,33 +210,119 @@ class ActorDownloadAPI(BaseDownloadAPI):
 class Downloader:
     """Handles file downloading operations."""
 
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 1.0  # seconds, doubled on every retry
+    MAX_RETRY_DELAY = 60.0  # a long Retry-After would park a worker and its connection
+    TIMEOUT = httpx.Timeout(10.0, read=5.0)
+    ASYNC_TIMEOUT = httpx.Timeout(10.0, read=30.0)
+    CHUNK_SIZE = 128 * 1024  # per-chunk overhead dominates below ~100 KiB
+
+    @staticmethod
+    def retry_delay(response: httpx.Response, attempt: int) -> float:
+        """Seconds to wait before retrying a rate limited (HTTP 429) request.
+
+        Retry-After is honored in both its seconds and HTTP-date forms, capped at MAX_RETRY_DELAY.
+        """
+        retry_after = response.headers.get("Retry-After", "").strip()
+        if retry_after.isdigit():
+            delay = float(retry_after)
+        elif retry_after:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = Downloader.BACKOFF_BASE * 2**attempt
+        else:
+            delay = Downloader.BACKOFF_BASE * 2**attempt
+        return min(max(delay, 0.0), Downloader.MAX_RETRY_DELAY)
+
+    @staticmethod
+    def connection_limits(max_connections: int) -> httpx.Limits:
+        """Pool limits matching the download concurrency, idle connections are all kept alive."""
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30.0,
+        )
+
+    @staticmethod
+    def is_encoded(response: httpx.Response) -> bool:
+        """Whether the body still needs content decoding, raw chunks are only safe otherwise."""
+        return response.headers.get("Content-Encoding", "identity").lower() != "identity"
+
+    @staticmethod
+    def speed_limiter(speed_limit_kbps: int) -> RateLimiter:
+        """Per-file byte bucket, throttling from the first byte.
+
+        The bucket starts empty, a full one would let any file smaller than one second of
+        transfer through unthrottled. Later bursts are capped at one second.
+        """
+        speed_limit_bps = speed_limit_kbps * 1024
+        return RateLimiter(speed_limit_bps, 1.0, full=False)
+
+    @staticmethod
+    def write_file(save_path: Path, data: bytearray) -> None:
+        """Write a fully received file in one call.
+
+        Images are small enough to be held in memory, buffering them avoids a write per chunk and
+        never leaves a partial file behind that would be skipped as downloaded on the next run.
+        The buffer goes straight to the file descriptor, bypassing Python's buffered IO layer.
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        fd = os.open(save_path, flags, 0o666)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view) :]
+        finally:
+            os.close(fd)
+
     @staticmethod
     def download(
         url: str,
         save_path: Path,
         headers: dict[str, str] | None,
         speed_limit_kbps: int,
+        client: httpx.Client | None = None,
     ) -> None:
-        """Download with speed limit."""
-        if headers is None:
-            headers = {}
-        chunk_size = 1024
-        speed_limit_bps = speed_limit_kbps * 1024
+        """Download with speed limit.
+
+        Pass a shared client to reuse its connections, otherwise a client is opened for this file.
+        """
+        if client is None:
+            with httpx.Client(timeout=Downloader.TIMEOUT) as client:
+                Downloader._download(url, save_path, headers, speed_limit_kbps, client)
+        else:
+            Downloader._download(url, save_path, headers, speed_limit_kbps, client)
 
-        timeout = httpx.Timeout(10.0, read=5.0)
-        with httpx.Client(timeout=timeout) as client:
+    @staticmethod
+    def _download(
+        url: str,
+        save_path: Path,
+        headers: dict[str, str] | None,
+        speed_limit_kbps: int,
+        client: httpx.Client,
+    ) -> None:
+        # images are already compressed, ask for the bytes as stored so they can be written verbatim
+        headers = {"Accept-Encoding": "identity", **(headers or {})}
+
+        for attempt in range(Downloader.MAX_RETRIES + 1):
             with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 429 and attempt < Downloader.MAX_RETRIES:
+                    time.sleep(Downloader.retry_delay(response, attempt))
+                    continue
                 response.raise_for_status()
-                with open(save_path, "wb") as file:
-                    start_time = time.time()
-                    downloaded = 0
-                    for chunk in response.iter_bytes(chunk_size=chunk_size):
-                        file.write(chunk)
-                        downloaded += len(chunk)
-                        elapsed_time = time.time() - start_time
-                        expected_time = downloaded / speed_limit_bps
-                        if elapsed_time < expected_time:
-                            time.sleep(expected_time - elapsed_time)
+                buffer = bytearray()
+                speed_limiter = Downloader.speed_limiter(speed_limit_kbps)
+                if Downloader.is_encoded(response):
+                    chunks = response.iter_bytes(Downloader.CHUNK_SIZE)
+                else:
+                    chunks = response.iter_raw(Downloader.CHUNK_SIZE)
+                for chunk in chunks:
+                    buffer += chunk
+                    speed_limiter.acquire(len(chunk))
+                Downloader.write_file(save_path, buffer)
+                return
 
     @staticmethod
     async def download_async(
@@ -140,27 +330,87 @@ class Downloader:
         save_path: Path,
         headers: dict[str, str] | None,
         speed_limit_kbps: int,
+        client: httpx.AsyncClient | None = None,
     ) -> None:
-        """Asynchronous download with speed limit."""
-        if headers is None:
-            headers = {}
-        chunk_size = 1024
-        speed_limit_bps = speed_limit_kbps * 1024
+        """Asynchronous download with speed limit.
 
-        timeout = httpx.Timeout(10.0, read=30.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        Pass a shared client to reuse its connections, otherwise a client is opened for this file.
+        """
+        if client is None:
+            async with httpx.AsyncClient(timeout=Downloader.ASYNC_TIMEOUT) as client:
+                await Downloader._download_async(url, save_path, headers, speed_limit_kbps, client)
+        else:
+            await Downloader._download_async(url, save_path, headers, speed_limit_kbps, client)
+
+    @staticmethod
+    async def _download_async(
+        url: str,
+        save_path: Path,
+        headers: dict[str, str] | None,
+        speed_limit_kbps: int,
+        client: httpx.AsyncClient,
+    ) -> None:
+        # images are already compressed, ask for the bytes as stored so they can be written verbatim
+        headers = {"Accept-Encoding": "identity", **(headers or {})}
+
+        for attempt in range(Downloader.MAX_RETRIES + 1):
             async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 429 and attempt < Downloader.MAX_RETRIES:
+                    await asyncio.sleep(Downloader.retry_delay(response, attempt))
+                    continue
                 response.raise_for_status()
-                with open(save_path, "wb") as file:
-                    start_time = asyncio.get_event_loop().time()
-                    downloaded = 0
-                    async for chunk in response.aiter_bytes(chunk_size=chunk_size):
-                        file.write(chunk)
-                        downloaded += len(chunk)
-                        elapsed_time = asyncio.get_event_loop().time() - start_time
-                        expected_time = downloaded / speed_limit_bps
-                        if elapsed_time < expected_time:
-                            await asyncio.sleep(expected_time - elapsed_time)
+                buffer = bytearray()
+                speed_limiter = Downloader.speed_limiter(speed_limit_kbps)
+                if Downloader.is_encoded(response):
+                    async_chunks = response.aiter_bytes(Downloader.CHUNK_SIZE)
+                else:
+                    async_chunks = response.aiter_raw(Downloader.CHUNK_SIZE)
+                async for chunk in async_chunks:
+                    buffer += chunk
+                    await speed_limiter.acquire_async(len(chunk))
+                # keep the disk write off the event loop so other downloads are not stalled
+                await asyncio.to_thread(Downloader.write_file, save_path, buffer)
+                return
+
+
+class FolderCache:
+    """Entry names of the download folders of one run, each folder is scanned once.
+
+    A name missing from the listing is a file that has to be downloaded, no stat is needed. A
+    listed name is confirmed on disk, so files deleted or moved during the run are downloaded
+    again. The owning download API clears the cache when it is closed.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Path, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def list_folder(self, folder: Path) -> set[str]:
+        """Return the entry names of a folder, creating the folder if needed."""
+        with self._lock:
+            entries = self._entries.get(folder)
+            if entries is None:
+                # different spellings of one folder share the listing of its resolved path
+                resolved = folder.resolve()
+                entries = self._entries.get(resolved)
+                if entries is None:
+                    resolved.mkdir(parents=True, exist_ok=True)
+                    entries = self._entries[resolved] = set(os.listdir(resolved))
+                self._entries[folder] = entries
+            return entries
+
+    def record_file(self, file_path: Path) -> None:
+        """Add a newly written file to its folder listing."""
+        entries = self.list_folder(file_path.parent)
+        with self._lock:
+            entries.add(file_path.name)
+
+    def file_exists(self, file_path: Path) -> bool:
+        return file_path.name in self.list_folder(file_path.parent) and file_path.exists()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
 
 
 class PathUtil:
@@ -172,12 +422,23 @@ class PathUtil:
         Path(folder_path).mkdir(parents=True, exist_ok=True)
 
     @staticmethod
-    def file_exists(file_path: Path | str, no_skip: bool, logger: logging.Logger) -> bool:
-        """Check if the file exists and log the status."""
-        if Path(file_path).exists() and not no_skip:
+    def file_exists(
+        file_path: Path | str,
+        no_skip: bool,
+        logger: logging.Logger,
+        folder_cache: FolderCache | None = None,
+    ) -> bool:
+        """Check if the file exists and log the status.
+
+        With a `folder_cache` only files listed in their folder are checked on disk.
+        """
+        if no_skip:
+            return False
+        file_path = Path(file_path)
+        exists = folder_cache.file_exists(file_path) if folder_cache else file_path.exists()
+        if exists:
             logger.info("File already exists: '%s'", file_path)
-            return True
-        return False
+        return exists
 
     @staticmethod
     def get_file_path(
@@ -185,20 +446,28 @@ class PathUtil:
         album_name: str,
         filename: str,
         extension: str,
+        folder_cache: FolderCache | None = None,
     ) -> Path:
         """Construct the file path for saving the downloaded file."""
         folder = Path(destination) / album_name
-        PathUtil.ensure_folder_exists(folder)
+        if folder_cache is None:
+            PathUtil.ensure_folder_exists(folder)
+        else:
+            folder_cache.list_folder(folder)
         sanitized_filename = sanitize_filename(filename)
         return folder / f"{sanitized_filename}.{extension}"
 
     @staticmethod
     def get_image_extension(url: str, default_ext: str = "jpg") -> str:
-        """Get the extension of a URL."""
-        image_extensions = r"(?:[^.]|^)\.(jpg|jpeg|png|gif|bmp|webp|tiff|svg)$"
-        match = re.search(image_extensions, url, re.IGNORECASE)
-        if match:
-            return match.group(1)
+        """Get the image extension from the path of a URL, the query and fragment are ignored.
+
+        The extension keeps its case, `default_ext` is returned for unknown or missing ones.
+        """
+        path = url.partition("?")[0].partition("#")[0]
+        stem, dot, ext = path.rpartition(".")
+        # keep the original case so existing files are still detected
+        if dot and not stem.endswith(".") and ext.lower() in _EXT_ALLOW:
+            return ext
         return default_ext
 
     @staticmethod
@@ -215,19 +484,41 @@ class AlbumTracker:
 
     def __init__(self, download_log: str):
         self.album_log_path = download_log
+        self._lock = threading.Lock()
+        self._log_file: TextIO | None = None
+        try:
+            with open(download_log) as f:
+                self._downloaded_albums: set[str] = set(f.read().splitlines())
+        except FileNotFoundError:
+            self._downloaded_albums = set()
 
     def is_downloaded(self, album_url: str) -> bool:
-        if os.path.exists(self.album_log_path):
-            with open(self.album_log_path) as f:
-                downloaded_albums = f.read().splitlines()
-            return album_url in downloaded_albums
-        return False
+        return album_url in self._downloaded_albums
 
     def log_downloaded(self, album_url: str) -> None:
+        """Record an album, the line is buffered until flush() or close()."""
         album_url = LinkParser.remove_page_num(album_url)
-        if not self.is_downloaded(album_url):
-            with open(self.album_log_path, "a") as f:
-                f.write(album_url + "\n")
+        with self._lock:
+            if album_url in self._downloaded_albums:
+                return
+            self._downloaded_albums.add(album_url)
+            if self._log_file is None:
+                self._log_file = open(self.album_log_path, "a", buffering=8192)
+            self._log_file.write(album_url + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
+    def __del__(self) -> None:
+        self.close()
 
 
 def download_album(
@@ -246,6 +537,11 @@ def download_album(
         no_skip=no_skip,
         logger=logger,
     )
-    for url, alt in file_links:
-        task_id = f"{album_name}_{alt}"
-        task_manager.download(task_id, url, alt, Path(destination))
+
+    async def run() -> None:
+        try:
+            await task_manager.download_many(album_name, file_links, Path(destination))
+        finally:
+            await task_manager.aclose()
+
+    asyncio.run(run())
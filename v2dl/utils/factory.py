@@ -1,8 +1,5 @@
-from collections.abc import Callable
-from dataclasses import dataclass
 from enum import Enum
 from logging import Logger
-from typing import Any
 
 from .download import (
     ActorDownloadAPI,
@@ -13,19 +10,6 @@ from .download import (
 from .multitask import AsyncService, BaseTaskService, ThreadingService
 
 
-@dataclass
-class Task:
-    """Unified task container for both threading and async services."""
-
-    task_id: str
-    func: Callable[..., Any]
-    args: tuple[Any, ...] = ()
-    kwargs: dict[str, Any] | None = None
-
-    def __post_init__(self) -> None:
-        self.kwargs = self.kwargs or {}
-
-
 class ServiceType(Enum):
     """Service type enumeration."""
 
@@ -49,12 +33,13 @@ class TaskServiceFactory:
         service_type: ServiceType,
         logger: Logger,
         max_workers: int = 5,
+        requests_per_second: float = 0,
     ) -> BaseTaskService:
         """Create a new task service instance."""
         if service_type == ServiceType.THREADING:
             return ThreadingService(logger, max_workers)
         elif service_type == ServiceType.ASYNC:
-            return AsyncService(logger, max_workers)
+            return AsyncService(logger, max_workers, requests_per_second)
         else:
             raise ValueError(f"Unknown service type: {service_type}")
 
@@ -77,6 +62,7 @@ class DownloadAPIFactory:
         no_skip: bool,
         logger: Logger,
         media_type: MediaType = MediaType.IMAGE,
+        max_connections: int = 64,
     ) -> BaseDownloadAPI:
         """Create a download API instance based on service type and media type."""
         api_class = cls._api_registry.get(service_type)
@@ -84,6 +70,6 @@ class DownloadAPIFactory:
             raise ValueError(f"Unknown service type: {service_type}")
 
         if media_type == MediaType.VIDEO:
-            return VideoDownloadAPI(headers, rate_limit, no_skip, logger)
+            return VideoDownloadAPI(headers, rate_limit, no_skip, logger, max_connections)
 
-        return api_class(headers, rate_limit, no_skip, logger)
+        return api_class(headers, rate_limit, no_skip, logger, max_connections)
@@ -1,12 +1,13 @@
-import queue
+import time
 import asyncio
 import threading
 from abc import ABC, abstractmethod
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from logging import Logger
-from queue import Queue
 from typing import Any
+from urllib.parse import urlsplit
 
 
 @dataclass
@@ -22,6 +23,43 @@ class Task:
         self.kwargs = self.kwargs or {}
 
 
+class RateLimiter:
+    """Token bucket allowing bursts of `tokens` calls and `tokens` calls per `period` on average.
+
+    acquire() only sleeps for the time the bucket actually needs to refill, so slow callers are
+    never delayed. acquire_async() is the same for coroutines, the state is not bound to an event
+    loop. A bucket created with `full=False` starts empty and throttles from the first call.
+    """
+
+    def __init__(self, tokens: float, period: float, full: bool = True) -> None:
+        self.capacity = float(tokens)
+        self.refill_rate = tokens / period
+        self.tokens = self.capacity if full else 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: float = 1) -> None:
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens and return how long the caller has to wait for them."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.updated = now
+            # a negative balance reserves the next tokens for this caller
+            self.tokens -= tokens
+            return -self.tokens / self.refill_rate if self.tokens < 0 else 0.0
+
+
 class BaseTaskService(ABC):
     """Abstract base class for task processing services."""
 
@@ -55,167 +93,275 @@ class BaseTaskService(ABC):
         """Stop the service."""
         pass
 
+    @abstractmethod
+    def add_cleanup(self, callback: Callable[[], Any]) -> None:
+        """Register a callback releasing resources used by the tasks, e.g. connection pools."""
+        pass
+
 
 class ThreadingService(BaseTaskService):
     """Service for processing tasks with multiple workers."""
 
     def __init__(self, logger: Logger, max_workers: int = 5):
-        self.task_queue: Queue[Task | None] = Queue()
         self.logger = logger
         self.max_workers = max_workers
-        self.workers: list[threading.Thread] = []
+        self.executor: ThreadPoolExecutor | None = None
+        self.futures: set[Future[None]] = set()
         self.results: dict[str, Any] = {}
+        self._results_lock = threading.Lock()
+        self.cleanup_callbacks: list[Callable[[], Any]] = []
         self._lock = threading.Lock()
         self.is_running = False
 
     def start(self) -> None:
-        if not self.is_running:
-            self.is_running = True
-            for _ in range(self.max_workers):
-                worker = threading.Thread(target=self._process_tasks, daemon=True)
-                self.workers.append(worker)
-                worker.start()
+        with self._lock:
+            self._ensure_executor()
 
-    def _process_tasks(self) -> None:
-        while True:
-            task = self.task_queue.get()
-            if task is None:
-                break
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="v2dl-dl")
+            self.is_running = True
+        return self.executor
 
-            try:
-                result = task.func(*task.args, **task.kwargs)  # type: ignore
-                with self._lock:
-                    self.results[task.task_id] = result
-            except Exception as e:
-                self.logger.error("Error processing task %s: %s", task.task_id, e)
-            finally:
-                self.task_queue.task_done()
+    def _run_task(self, task: Task) -> None:
+        try:
+            result = task.func(*task.args, **task.kwargs)  # type: ignore
+            self._store_result(task.task_id, result)
+        except Exception as e:
+            self.logger.error("Error processing task %s: %s", task.task_id, e)
 
     def add_task(self, task: Task) -> None:
-        self.task_queue.put(task)
-        if not self.is_running:
-            self.start()
+        self.add_tasks([task])
 
     def add_tasks(self, tasks: list[Task]) -> None:
-        for task in tasks:
-            self.task_queue.put(task)
-        if not self.is_running:
-            self.start()
+        with self._lock:
+            executor = self._ensure_executor()
+            for task in tasks:
+                future = executor.submit(self._run_task, task)
+                self.futures.add(future)
+                future.add_done_callback(self.futures.discard)
+
+    def _store_result(self, task_id: str, result: Any) -> None:
+        with self._results_lock:
+            self.results[task_id] = result
 
     def get_result(self, task_id: str) -> Any | None:
-        with self._lock:
+        with self._results_lock:
             return self.results.pop(task_id, None)
 
     def get_results(self, max_results: int = 0) -> dict[str, Any]:
-        with self._lock:
+        # the lock keeps a finishing task from writing into a dict already handed out
+        with self._results_lock:
             if max_results <= 0:
-                results_to_return = self.results.copy()
-                self.results.clear()
+                results_to_return, self.results = self.results, {}
                 return results_to_return
 
-            keys = list(self.results.keys())[:max_results]
+            keys = list(self.results)[:max_results]
             return {key: self.results.pop(key) for key in keys}
 
     def stop(self, timeout: int | None = None) -> None:
-        self.task_queue.join()
-        for _ in range(self.max_workers):
-            self.task_queue.put(None)
-        for worker in self.workers:
-            worker.join(timeout=timeout)
-        self.workers.clear()
-        self.is_running = False
+        """Wait for the submitted tasks, at most `timeout` seconds, and shut the pool down.
+
+        The cleanup callbacks run once every task is done, in the background if `timeout` expires.
+        """
+        with self._lock:
+            executor, self.executor = self.executor, None
+            futures = set(self.futures)
+            self.is_running = False
+        if executor is not None:
+            _, not_done = wait(futures, timeout=timeout)
+            executor.shutdown(wait=False)
+            if not_done:
+                # the callbacks close resources the running tasks still use, e.g. the client
+                self.logger.warning(
+                    "%d tasks still running after stop, cleanup deferred until they finish",
+                    len(not_done),
+                )
+                threading.Thread(
+                    target=self._deferred_cleanup,
+                    args=(not_done,),
+                    name="v2dl-dl-cleanup",
+                    daemon=True,
+                ).start()
+                return
+        self._run_cleanup()
+
+    def _deferred_cleanup(self, futures: set[Future[None]]) -> None:
+        wait(futures)
+        self._run_cleanup()
+
+    def _run_cleanup(self) -> None:
+        for callback in self.cleanup_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                self.logger.error("Error in cleanup callback: %s", e)
+
+    def add_cleanup(self, callback: Callable[[], Any]) -> None:
+        """Register a callback called once the workers have stopped."""
+        self.cleanup_callbacks.append(callback)
 
 
 class AsyncService(BaseTaskService):
-    def __init__(self, logger: Logger, max_workers: int = 5) -> None:
+    """Service for processing coroutine tasks on a background event loop.
+
+    The loop runs in its own thread from the first task until stop(), tasks are handed over through
+    an asyncio.Queue and the semaphore bounds how many run at once.
+
+    requests_per_second caps how many tasks start per second for each host, read from the `url`
+    kwarg of the tasks. 0 disables the limit.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        max_workers: int = 5,
+        requests_per_second: float = 0,
+    ) -> None:
         self.max_workers = max_workers
         self.logger = logger
+        self.requests_per_second = requests_per_second
+        self.limiters: dict[str, RateLimiter] = {}
         self.is_running = False
         self.loop: asyncio.AbstractEventLoop | None = None
         self.thread: threading.Thread | None = None
         self._lock = threading.Lock()
 
-        self.task_queue: queue.Queue[Task] = queue.Queue()
+        # created on the event loop, None is the stop signal
+        self.task_queue: asyncio.Queue[Task | None] | None = None
+        self.sem: asyncio.Semaphore | None = None
         self.results: dict[str, Any] = {}
-        self.current_tasks: list[asyncio.Task[Any]] = []
-        self.sem = asyncio.Semaphore(self.max_workers)
+        self._results_lock = threading.Lock()
+        self.cleanup_callbacks: list[Callable[[], Awaitable[Any]]] = []
 
     def start(self) -> None:
-        self._check_thread()
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                # one event per thread, a previous loop finishing late must not release this start
+                loop_ready = threading.Event()
+                self.thread = threading.Thread(
+                    target=self._start_event_loop,
+                    args=(loop_ready,),
+                    name="v2dl-async",
+                    daemon=True,
+                )
+                self.thread.start()
+                loop_ready.wait()
+                self.is_running = True
 
     def add_task(self, task: Task) -> None:
-        self.task_queue.put(task)
-        self._check_thread()
+        self.add_tasks([task])
 
     def add_tasks(self, tasks: list[Task]) -> None:
+        self.start()
         for task in tasks:
-            self.task_queue.put(task)
-        self._check_thread()
+            self._put(task)
+
+    def _put(self, task: Task | None) -> None:
+        if self.loop is None or self.task_queue is None:
+            raise RuntimeError("AsyncService event loop is not running")
+        self.loop.call_soon_threadsafe(self.task_queue.put_nowait, task)
+
+    def _store_result(self, task_id: str, result: Any) -> None:
+        with self._results_lock:
+            self.results[task_id] = result
 
     def get_result(self, task_id: str) -> Any | None:
-        with self._lock:
+        with self._results_lock:
             return self.results.pop(task_id, None)
 
     def get_results(self, max_results: int = 0) -> dict[str, Any]:
-        with self._lock:
+        # the lock keeps a finishing task from writing into a dict already handed out
+        with self._results_lock:
             if max_results <= 0:
-                results_to_return = self.results.copy()
-                self.results.clear()
+                results_to_return, self.results = self.results, {}
                 return results_to_return
 
-            keys = list(self.results.keys())[:max_results]
+            keys = list(self.results)[:max_results]
             return {key: self.results.pop(key) for key in keys}
 
-    async def _process_tasks(self) -> None:
-        while True:
-            self.current_tasks = [task for task in self.current_tasks if not task.done()]
+    async def _process_tasks(self, loop_ready: threading.Event) -> None:
+        # the queue and semaphore stay local, a restarted service publishes its own ones
+        task_queue: asyncio.Queue[Task | None] = asyncio.Queue()
+        sem = asyncio.Semaphore(self.max_workers)
+        self.task_queue, self.sem = task_queue, sem
+        loop_ready.set()
 
-            if self.task_queue.empty() and not self.current_tasks:
+        running: set[asyncio.Task[Any]] = set()
+        while True:
+            task = await task_queue.get()
+            if task is None:
                 break
-
-            while not self.task_queue.empty() and len(self.current_tasks) < self.max_workers:
-                try:
-                    task = self.task_queue.get_nowait()
-                    task_obj = asyncio.create_task(self._run_task(task))
-                    self.current_tasks.append(task_obj)
-                except queue.Empty:
-                    break
-
-            if self.current_tasks:
-                await asyncio.wait(self.current_tasks, return_when=asyncio.FIRST_COMPLETED)
-
-    async def _run_task(self, task: Task) -> Any:
-        async with self.sem:
+            task_obj = asyncio.create_task(self._run_task(task, sem))
+            running.add(task_obj)
+            task_obj.add_done_callback(running.discard)
+
+        # the stop signal is queued behind every task, wait for the ones still running
+        if running:
+            await asyncio.wait(running)
+
+    def _get_limiter(self, task: Task) -> RateLimiter | None:
+        url = task.kwargs.get("url") if task.kwargs else None
+        if self.requests_per_second <= 0 or not isinstance(url, str):
+            return None
+        host = urlsplit(url).netloc
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = self.limiters[host] = RateLimiter(self.requests_per_second, 1.0)
+        return limiter
+
+    async def _run_task(self, task: Task, sem: asyncio.Semaphore) -> Any:
+        limiter = self._get_limiter(task)
+        if limiter is not None:
+            await limiter.acquire_async()
+        async with sem:
             try:
                 result = await task.func(*task.args, **task.kwargs)  # type: ignore
-                with self._lock:
-                    self.results[task.task_id] = result
+                self._store_result(task.task_id, result)
                 return result
             except Exception as e:
-                self.logger.error(f"Error processing task {task.task_id}: {e}")
-                with self._lock:
-                    self.results[task.task_id] = None
-
-    def _check_thread(self) -> None:
-        with self._lock:
-            if not self.is_running or self.thread is None or not self.thread.is_alive():
-                self.is_running = True
-                self.thread = threading.Thread(target=self._start_event_loop)
-                self.thread.start()
+                self.logger.error("Error processing task %s: %s", task.task_id, e)
+                self._store_result(task.task_id, None)
 
-    def _start_event_loop(self) -> None:
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
+    def _start_event_loop(self, loop_ready: threading.Event) -> None:
+        # start() holds the lock until loop_ready is set, so no other loop is published meanwhile
+        loop = self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
         try:
-            self.loop.run_until_complete(self._process_tasks())
+            loop.run_until_complete(self._process_tasks(loop_ready))
         finally:
-            self.loop.close()
-            self.loop = None
-            self.is_running = False
-            self.current_tasks.clear()
+            loop_ready.set()  # never leave start() waiting
+            loop.run_until_complete(self._run_cleanup())
+            loop.close()
+            with self._lock:
+                # after a timed out stop() the service may already run a newer loop
+                if self.loop is loop:
+                    self.loop = None
+                    self.task_queue = None
+                    self.sem = None
+                    self.is_running = False
+
+    async def _run_cleanup(self) -> None:
+        for callback in self.cleanup_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                self.logger.error("Error in cleanup callback: %s", e)
+
+    def add_cleanup(self, callback: Callable[[], Awaitable[Any]]) -> None:
+        """Register a coroutine function awaited on the event loop before it closes."""
+        self.cleanup_callbacks.append(callback)
 
     def stop(self, timeout: int | None = None) -> None:
-        if self.thread is not None:
-            self.thread.join(timeout=timeout)
-            self.thread = None
-            self.is_running = False
+        """Let the queued tasks finish, then close the event loop.
+
+        If `timeout` expires first, the loop keeps draining in the background and closes itself,
+        a later task starts a new loop.
+        """
+        with self._lock:
+            thread, self.thread = self.thread, None
+            if thread is not None and self.loop is not None:
+                self._put(None)
+        if thread is not None:
+            # is_running is cleared by the loop thread once it has really finished
+            thread.join(timeout=timeout)
@@ -1,13 +1,19 @@
 import re
+from collections.abc import Callable
 from logging import Logger
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
-from lxml import html
+from lxml import etree, html
 
 
 class LinkParser:
     """Tool class for parsing and modifying URLs."""
 
+    XPATH_PAGE_LINKS = etree.XPath(
+        '//li[@class="page-item"]/a[@class="page-link" and string-length(text()) <= 2]/@href',
+    )
+    PAGE_NUMBER_PATTERN = re.compile(r"page=(\d+)")
+
     @staticmethod
     def parse_input_url(url: str) -> tuple[list[str], int]:
         """
@@ -36,7 +42,8 @@ class LinkParser:
         Returns:
             html.HtmlElement | None: Parsed HTML element or None if parsing fails.
         """
-        if "Failed" in html_content:
+        # the web bots return an error message instead of the page source when loading fails
+        if html_content.startswith("Failed to retrieve URL"):
             return None
 
         try:
@@ -56,16 +63,14 @@ class LinkParser:
         Returns:
             int: Maximum page number, default is 1 if none found.
         """
-        page_links = tree.xpath(
-            '//li[@class="page-item"]/a[@class="page-link" and string-length(text()) <= 2]/@href',
-        )
+        page_links = LinkParser.XPATH_PAGE_LINKS(tree)
 
         if not page_links:
             return 1
 
         page_numbers = []
         for link in page_links:
-            match = re.search(r"page=(\d+)", link)
+            match = LinkParser.PAGE_NUMBER_PATTERN.search(link)
             if match:
                 page_number = int(match.group(1))
             else:
@@ -102,6 +107,39 @@ class LinkParser:
         # urlunparse: 'https://example.com/search?q=test&sort=asc&page=3'
         return urlunparse(new_url)
 
+    @staticmethod
+    def make_page_url_builder(url: str) -> Callable[[int], str]:
+        """
+        Parses the URL once and returns a function building the URL of a given page.
+
+        The built URLs are identical to the ones of add_page_num.
+
+        Args:
+            url (str): Original URL.
+
+        Returns:
+            Callable[[int], str]: Function taking a page number and returning the page URL.
+        """
+        parsed_url = urlparse(url)
+        query_params = parse_qs(parsed_url.query)
+        query_params["page"] = []  # keeps the position of an existing page parameter
+
+        keys = list(query_params)
+        page_index = keys.index("page")
+        before = urlencode({k: query_params[k] for k in keys[:page_index]}, doseq=True)
+        after = urlencode({k: query_params[k] for k in keys[page_index + 1 :]}, doseq=True)
+        prefix = urlunparse(parsed_url._replace(query="", fragment="")) + "?"
+        if before:
+            prefix += before + "&"
+        suffix = "&" + after if after else ""
+        if parsed_url.fragment:
+            suffix += "#" + parsed_url.fragment
+
+        def build(page: int) -> str:
+            return f"{prefix}page={page}{suffix}"
+
+        return build
+
     @staticmethod
     def remove_page_num(url: str) -> str:
         """
@@ -1,10 +1,13 @@
 import os
+import re
 import sys
+import hmac
 import atexit
-import base64
 import ctypes
 import random
+import hashlib
 import secrets
+import functools
 import threading
 from dataclasses import dataclass
 from datetime import datetime, timedelta
@@ -12,7 +15,8 @@ from logging import Logger
 from typing import Any, Literal, overload
 
 import yaml
-from dotenv import load_dotenv, set_key
+from dotenv import load_dotenv
+from nacl.exceptions import CryptoError
 from nacl.public import PrivateKey, PublicKey, SealedBox
 from nacl.pwhash import argon2id
 from nacl.secret import SecretBox
@@ -20,6 +24,16 @@ from nacl.utils import EncryptedMessage, random as nacl_random
 
 from ..common import BaseConfigManager, EncryptionConfig, SecurityError
 
+try:  # use libyaml if PyYAML is built with it
+    from yaml import CSafeDumper as SafeDumper, CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader  # type: ignore[assignment]
+
+try:  # SIMD base64 when pybase64 is installed, same API as the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64  # type: ignore[no-redef]
+
 
 @dataclass
 class KeyPair:
@@ -33,50 +47,63 @@ class Encryptor:
     def __init__(self, logger: Logger, encrypt_config: EncryptionConfig) -> None:
         self.logger = logger
         self.encrypt_config = encrypt_config
+        # keyed by the public half, the private key never becomes a cache key
+        self._unsealing_boxes: dict[bytes, SealedBox[PrivateKey]] = {}
 
-    def encrypt_master_key(self, master_key: bytes) -> tuple[bytes, bytes, bytes]:
-        salt = secrets.token_bytes(self.encrypt_config.salt_bytes)
+    def encrypt_master_key(self, master_key: bytes) -> tuple[bytes, bytes]:
         encryption_key = secrets.token_bytes(self.encrypt_config.key_bytes)
-        derived_key = self.derive_key(encryption_key, salt)
 
-        box = SecretBox(derived_key)
+        box = SecretBox(encryption_key)
         nonce = nacl_random(self.encrypt_config.nonce_bytes)
         encrypted_master_key = box.encrypt(master_key, nonce)
 
-        derived_key = bytearray(len(derived_key))
         self.logger.info("Master key encryption successful")
-        return encrypted_master_key, salt, encryption_key
+        return encrypted_master_key, encryption_key
 
     def decrypt_master_key(
         self,
         encrypted_master_key: bytes,
-        salt: str,
         encryption_key: str,
+        salt: str | None = None,
     ) -> bytes:
-        salt_b64 = base64.b64decode(salt)
-        enc_key_b64 = base64.b64decode(encryption_key)
-        derived_key = self.derive_key(enc_key_b64, salt_b64)
-        box = SecretBox(derived_key)
-
-        master_key = box.decrypt(encrypted_master_key)
+        """Decrypt the master key with the key stored in .env.
+
+        Key stores created before the KDF was dropped also carry a SALT entry, in which case the
+        box key is still derived from (encryption_key, salt).
+        """
+        raw_key = base64.b64decode(encryption_key)
+        if salt:
+            derived_key = self.derive_key(raw_key, base64.b64decode(salt))
+            try:
+                master_key = SecretBox(derived_key).decrypt(encrypted_master_key)
+            except CryptoError:
+                # migrated by migrate_master_key, but SALT could not be removed from .env
+                master_key = SecretBox(raw_key).decrypt(encrypted_master_key)
+        else:
+            master_key = SecretBox(raw_key).decrypt(encrypted_master_key)
 
         self.logger.info("Master key decryption successful")
         return master_key
 
-    def encrypt_private_key(self, private_key: PrivateKey, master_key: bytes) -> EncryptedMessage:
-        box = SecretBox(master_key)
+    def encrypt_private_key(
+        self,
+        private_key: PrivateKey,
+        master_key: bytes | bytearray,
+    ) -> EncryptedMessage:
+        box = SecretBox(bytes(master_key))
         nonce = nacl_random(self.encrypt_config.nonce_bytes)
         return box.encrypt(private_key.encode(), nonce)
 
-    def decrypt_private_key(self, encrypted_private_key: bytes, master_key: bytes) -> PrivateKey:
-        box = SecretBox(master_key)
-        private_key_bytes = box.decrypt(encrypted_private_key)
-        private_key = PrivateKey(private_key_bytes)
-        cleanup([private_key_bytes])
-        return private_key
+    def decrypt_private_key(
+        self,
+        encrypted_private_key: bytes,
+        master_key: bytes | bytearray,
+    ) -> PrivateKey:
+        box = SecretBox(bytes(master_key))
+        return PrivateKey(box.decrypt(encrypted_private_key))
 
     def encrypt_password(self, password: str, public_key: PublicKey) -> str:
-        sealed_box = SealedBox(public_key)
+        sealed_box = _get_sealing_box(public_key.encode())
         encrypted = sealed_box.encrypt(password.encode())
         self.logger.info("Password encryption successful")
         return base64.b64encode(encrypted).decode("utf-8")
@@ -84,13 +111,26 @@ class Encryptor:
     def decrypt_password(self, encrypted_password: str, private_key: PrivateKey) -> str:
         try:
             encrypted = base64.b64decode(encrypted_password)
-            sealed_box = SealedBox(private_key)
+            cache_key = private_key.public_key.encode()
+            sealed_box = self._unsealing_boxes.get(cache_key)
+            if sealed_box is None:
+                sealed_box = self._unsealing_boxes[cache_key] = SealedBox(private_key)
             decrypted = sealed_box.decrypt(encrypted)
             return decrypted.decode()
         except Exception as e:
             self.logger.error("Password decryption failed: %s", str(e))
             raise SecurityError from e
 
+    def password_mac(self, password: str, private_key: PrivateKey) -> str:
+        """Keyed hash for checking a password without decrypting the stored one.
+
+        The key comes from the private key, so the mac is no easier to brute-force offline than
+        the sealed password itself.
+        """
+        mac_key = hashlib.blake2b(private_key.encode(), person=b"v2dl-pw-mac").digest()
+        mac = hashlib.blake2b(password.encode(), key=mac_key, digest_size=16).digest()
+        return base64.b64encode(mac).decode("utf-8")
+
     def derive_key(self, encryption_key: bytes, salt: bytes) -> bytes:
         return argon2id.kdf(
             self.encrypt_config.key_bytes,
@@ -101,19 +141,11 @@ class Encryptor:
         )
 
     def validate_keypair(self, private_key: PrivateKey, public_key: PublicKey) -> None:
-        try:
-            test_data = b"test"
-            sealed_box = SealedBox(public_key)
-            sealed_box_priv = SealedBox(private_key)
-
-            encrypted = sealed_box.encrypt(test_data)
-            decrypted = sealed_box_priv.decrypt(encrypted)
-
-            if decrypted != test_data:
-                raise SecurityError
-        except Exception as e:
-            self.logger.error("Key pair validation failed: %s", str(e))
-            raise SecurityError from e
+        # PrivateKey already derives its public key on construction, comparing it with the
+        # stored one verifies the pair without a SealedBox round trip.
+        if not hmac.compare_digest(private_key.public_key.encode(), public_key.encode()):
+            self.logger.error("Key pair validation failed: public key mismatch")
+            raise SecurityError("Key pair validation failed")
 
 
 class KeyIOHelper(Encryptor):
@@ -145,7 +177,7 @@ class KeyIOHelper(Encryptor):
 
     def load_keys(self) -> KeyPair:
         self.logger.debug("Loading and validating keys")
-        master_key = self.load_master_key()
+        master_key = bytearray(self.load_master_key())
         private_key = self.load_private_key(master_key)
         public_key = self.load_public_key()
 
@@ -155,48 +187,80 @@ class KeyIOHelper(Encryptor):
         self.logger.info("Keys loaded and validated successfully")
         return KeyPair(private_key, public_key)
 
-    def load_secret(self, env_path: str) -> tuple[str, str]:
-        """Load and validate salt and encryption_key from .env file."""
-        load_dotenv(env_path)
-        salt_base64 = SecureFileHandler.read_env("SALT")
+    def load_secret(self, env_path: str) -> tuple[str, str | None]:
+        """Load encryption_key and the legacy salt (if any) from .env file."""
+        SecureFileHandler.load_env(env_path)
         encryption_key_base64 = SecureFileHandler.read_env("ENCRYPTION_KEY")
-        return salt_base64, encryption_key_base64
+        salt_base64 = os.getenv("SALT")
+        return encryption_key_base64, salt_base64
 
     def load_master_key(self, path: str | None = None) -> bytes:
         _path = self.path_config["master_key_file"] if path is None else path
         encrypted_master_key = SecureFileHandler.read_file(_path, False)
-        salt, encryption_key = self.load_secret(self.path_config["env_path"])
-        return self.decrypt_master_key(encrypted_master_key, salt, encryption_key)
+        encryption_key, salt = self.load_secret(self.path_config["env_path"])
+        master_key = self.decrypt_master_key(encrypted_master_key, encryption_key, salt)
+        if salt and path is None:
+            self.migrate_master_key(master_key, encryption_key)
+        return master_key
+
+    def migrate_master_key(self, master_key: bytes, encryption_key: str) -> None:
+        """Re-encrypt a legacy master key with the raw encryption key and drop SALT from .env.
+
+        After that the KDF is never needed again for this key store.
+        """
+        box = SecretBox(base64.b64decode(encryption_key))
+        nonce = nacl_random(self.encrypt_config.nonce_bytes)
+        try:
+            SecureFileHandler.write_file(
+                self.path_config["master_key_file"],
+                box.encrypt(master_key, nonce),
+            )
+            SecureFileHandler.update_env(self.path_config["env_path"], {"SALT": None})
+        except OSError as e:
+            self.logger.warning("Master key migration failed: %s", e)
+            return
+        self.logger.info("Master key migrated, key derivation is no longer needed")
 
     def load_public_key(self, path: str | None = None) -> PublicKey:
         _path = self.path_config["public_key_file"] if path is None else path
         public_key_bytes = SecureFileHandler.read_file(_path, False)
         return PublicKey(public_key_bytes)
 
-    def load_private_key(self, master_key: bytes, path: str | None = None) -> PrivateKey:
+    def load_private_key(
+        self,
+        master_key: bytes | bytearray,
+        path: str | None = None,
+    ) -> PrivateKey:
         _path = self.path_config["private_key_file"] if path is None else path
         encrypted_private_key = SecureFileHandler.read_file(_path, False)
         return self.decrypt_private_key(encrypted_private_key, master_key)
 
-    def save_keys(self, keys: tuple[bytes, bytes, PublicKey, bytes, bytes]) -> None:
+    def save_keys(self, keys: tuple[bytes, bytes, PublicKey, bytes]) -> None:
         SecureFileHandler.write_file(self.path_config["master_key_file"], keys[0])
         SecureFileHandler.write_file(self.path_config["private_key_file"], keys[1])
         SecureFileHandler.write_file(self.path_config["public_key_file"], keys[2].encode(), 0o644)
-        SecureFileHandler.write_env(self.path_config["env_path"], "SALT", keys[3])
-        SecureFileHandler.write_env(self.path_config["env_path"], "ENCRYPTION_KEY", keys[4])
+        # a stale SALT would make the new master key be decrypted with a derived key
+        SecureFileHandler.update_env(
+            self.path_config["env_path"],
+            {"ENCRYPTION_KEY": keys[3], "SALT": None},
+        )
+
+    def check_folder(self) -> set[str]:
+        """Ensure the key folder exists with 0o700 permission and return its entry names."""
+        key_folder = self.path_config["key_folder"]
+        try:
+            current_permissions = os.stat(key_folder).st_mode & 0o777
+        except FileNotFoundError:
+            os.makedirs(key_folder, mode=0o700)
+            self.logger.info("Secure folder created at %s", key_folder)
+            return set()
 
-    def check_folder(self) -> None:
-        if not os.path.exists(self.path_config["key_folder"]):
-            os.makedirs(self.path_config["key_folder"], mode=0o700)
-            self.logger.info("Secure folder created at %s", self.path_config["key_folder"])
-        elif not self.check_permission(self.path_config["key_folder"]):
-            os.chmod(self.path_config["key_folder"], 0o700)
-            self.logger.info("Permissions updated for folder at %s", self.path_config["key_folder"])
+        if current_permissions != 0o700:
+            os.chmod(key_folder, 0o700)
+            self.logger.info("Permissions updated for folder at %s", key_folder)
 
-    def check_permission(self, folder_path: str) -> bool:
-        folder_permission = 0o700
-        current_permissions = os.stat(folder_path).st_mode & 0o777
-        return current_permissions == folder_permission
+        with os.scandir(key_folder) as entries:
+            return {entry.name for entry in entries}
 
 
 class KeyManager(KeyIOHelper):
@@ -209,29 +273,35 @@ class KeyManager(KeyIOHelper):
         path_dict: dict[str, str] | None = None,
     ) -> None:
         super().__init__(logger, path_dict, encrypt_config)
-        self.check_folder()
+        folder_entries = self.check_folder()
 
-        keys = self._init_keys()
+        keys = self._init_keys(folder_entries)
         if keys is not None:
             self.save_keys(keys)
 
-    def _init_keys(self) -> tuple[bytes, bytes, PublicKey, bytes, bytes] | None:
-        if self._keys_exist():
+    def _init_keys(self, folder_entries: set[str]) -> tuple[bytes, bytes, PublicKey, bytes] | None:
+        if self._keys_exist(folder_entries):
             self.logger.info("Key pair already exists")
             return None
 
-        self.check_folder()
         return self._generate_and_encrypt_keys()
 
-    def _keys_exist(self) -> bool:
-        return os.path.exists(self.path_config["private_key_file"]) and os.path.exists(
-            self.path_config["public_key_file"],
-        )
-
-    def _generate_and_encrypt_keys(self) -> tuple[bytes, bytes, PublicKey, bytes, bytes]:
+    def _keys_exist(self, folder_entries: set[str]) -> bool:
+        """Check the key files against the key folder listing, stat only files stored elsewhere."""
+        key_folder = os.path.normpath(self.path_config["key_folder"])
+        for key_file in (self.path_config["private_key_file"], self.path_config["public_key_file"]):
+            folder, name = os.path.split(os.path.normpath(key_file))
+            if folder == key_folder:
+                if name not in folder_entries:
+                    return False
+            elif not os.path.exists(key_file):
+                return False
+        return True
+
+    def _generate_and_encrypt_keys(self) -> tuple[bytes, bytes, PublicKey, bytes]:
         keys = self._generate_key_pair()
-        master_key = secrets.token_bytes(self.encrypt_config.key_bytes)
-        encrypted_master_key, salt, encryption_key = self.encrypt_master_key(master_key)
+        master_key = bytearray(secrets.token_bytes(self.encrypt_config.key_bytes))
+        encrypted_master_key, encryption_key = self.encrypt_master_key(bytes(master_key))
         encrypted_private_key = self.encrypt_private_key(keys.private_key, master_key)
 
         cleanup([master_key])
@@ -240,7 +310,6 @@ class KeyManager(KeyIOHelper):
             encrypted_master_key,
             encrypted_private_key,
             keys.public_key,
-            salt,
             encryption_key,
         )
 
@@ -262,8 +331,9 @@ class AccountManager:
         self.key_manager = key_manager
         self.lock = threading.RLock()
         self.accounts, self.runtime_state = self._load_yaml()
+        self._dirty = False
         self.check()
-        atexit.register(self._save_yaml)
+        atexit.register(self.save)
 
     def create(self, username: str, password: str, cookies: str, public_key: PublicKey) -> None:
         with self.lock:
@@ -275,17 +345,17 @@ class AccountManager:
                 "exceed_time": "",
                 "cookies": cookies,
             }
-        self.logger.info("Account %s has been created.", username)
-        self._save_yaml()
+            self.logger.info("Account %s has been created.", username)
+            self._save_yaml()
 
     def delete(self, username: str) -> None:
         with self.lock:
             if username in self.accounts:
                 del self.accounts[username]
                 self.logger.info("Account %s has been deleted.", username)
+                self._save_yaml()
             else:
                 self.logger.error("Account %s not found.", username)
-            self._save_yaml()
 
     def read(self, username: str) -> dict[str, Any] | None:
         return self.accounts.get(username)
@@ -307,8 +377,10 @@ class AccountManager:
                     self.accounts[new_username or old_username]["encrypted_password"] = (
                         encrypted_password
                     )
+                    self.accounts[new_username or old_username].pop("password_mac", None)
                 if new_cookies:
                     self.accounts[new_username or old_username]["cookies"] = new_cookies
+                self._save_yaml()
                 self.logger.info("Account %s has been updated.", old_username)
             else:
                 self.logger.error("Account not found.")
@@ -319,8 +391,9 @@ class AccountManager:
             if account:
                 if field in account:
                     account[field] = new_value
-                    self.logger.info("Updated %s for account %s.", field, username)
+                    # quota flags must survive a crash, otherwise the next run picks the account again
                     self._save_yaml()
+                    self.logger.info("Updated %s for account %s.", field, username)
                 else:
                     self.logger.error("Field '%s' does not exist in account '%s'.", field, account)
             else:
@@ -343,9 +416,21 @@ class AccountManager:
             self.logger.error("Account does not exist.")
             return False
 
-        encrypted_password = account.get("encrypted_password")
-        decrypted_password = self.key_manager.decrypt_password(encrypted_password, private_key)
-        if decrypted_password == password:
+        password_mac = self.key_manager.password_mac(password, private_key)
+        stored_mac = account.get("password_mac")
+        if stored_mac:
+            is_valid = hmac.compare_digest(stored_mac.encode(), password_mac.encode())
+        else:
+            # accounts saved before the mac existed, store it once the password is confirmed
+            encrypted_password = account.get("encrypted_password")
+            decrypted_password = self.key_manager.decrypt_password(encrypted_password, private_key)
+            is_valid = hmac.compare_digest(decrypted_password.encode(), password.encode())
+            if is_valid:
+                with self.lock:
+                    account["password_mac"] = password_mac
+                    self._dirty = True
+
+        if is_valid:
             print("*----------------*")
             print("|Password correct|")
             print("*----------------*")
@@ -359,7 +444,6 @@ class AccountManager:
     def check(self) -> None:
         """檢查所有帳號的 exceed_time 是否超過 24 小時，若超過則清除 exceed_time 並將重置 exceed_quota."""
         now = datetime.now()
-        update = False
 
         for _, account in self.accounts.items():
             exceed_time = account.get("exceed_time", "")
@@ -368,10 +452,7 @@ class AccountManager:
                 if now - exceed_time_time > timedelta(hours=24):
                     account["exceed_time"] = ""
                     account["exceed_quota"] = False
-                    update = True
-
-        if update:
-            self._save_yaml()
+                    self._dirty = True
 
     def random_pick(self, private_key: PrivateKey) -> tuple[str, str]:
         eligible_accounts = {k: v for k, v in self.accounts.items() if not v["exceed_quota"]}
@@ -399,16 +480,26 @@ class AccountManager:
 
         return username, dec_pw
 
+    def save(self) -> None:
+        """Write the deferred background updates, the password mac backfill and the check() resets.
+
+        Runs at exit, so repeated background updates cost a single dump.
+        """
+        with self.lock:
+            if self._dirty:
+                self._save_yaml()
+
     def _save_yaml(self) -> None:
         with self.lock:
-            with open(self.yaml_path, "w") as file:
-                yaml.dump(self.accounts, file, default_flow_style=False)
+            data = yaml.dump(self.accounts, Dumper=SafeDumper, default_flow_style=False)
+            SecureFileHandler.write_file(self.yaml_path, data, 0o600)
+            self._dirty = False
         # self.logger.info("Successfully update accounts information.")
 
     def _load_yaml(self) -> tuple[dict[str, Any], dict[str, Any]]:
         try:
             with open(self.yaml_path) as file:
-                account = yaml.safe_load(file) or {}
+                account = yaml.load(file, Loader=SafeLoader) or {}
             runtime_state = self._login_state(account)
             return account, runtime_state
         except FileNotFoundError:
@@ -425,15 +516,28 @@ class AccountManager:
         }
 
 
+_ENV_KEY_PATTERN = re.compile(r"^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_.]*)\s*=")
+_loaded_env_paths: set[str] = set()
+
+
 class SecureFileHandler:
     @staticmethod
     def write_file(path: str, data: str | bytes, permissions: int = 0o400) -> None:
         if isinstance(data, str):
             data = data.encode("utf-8")
 
-        with open(path, "wb") as f:
-            f.write(data)
-        os.chmod(path, permissions)
+        # write a sibling temp file and swap it in, so the (read-only) target is never half written.
+        # The file is created with its final mode, it is never readable by others and needs no chmod.
+        tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        fd = os.open(tmp_path, flags, permissions)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
     @staticmethod
     @overload
@@ -452,11 +556,55 @@ class SecureFileHandler:
 
     @staticmethod
     def write_env(env_path: str, key: str, value: str | bytes) -> None:
-        if isinstance(value, bytes):
-            value = base64.b64encode(value).decode("utf-8")
+        SecureFileHandler.update_env(env_path, {key: value})
+
+    @staticmethod
+    def update_env(env_path: str, updates: dict[str, str | bytes | None]) -> None:
+        """Set, or remove when the value is None, several .env entries with one atomic rewrite."""
+        values = {
+            key: base64.b64encode(value).decode("utf-8") if isinstance(value, bytes) else value
+            for key, value in updates.items()
+        }
+        try:
+            with open(env_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = []
+
+        pending = dict(values)
+        new_lines = []
+        for line in lines:
+            match = _ENV_KEY_PATTERN.match(line)
+            key = match.group(1) if match else None
+            if key not in values:
+                new_lines.append(line)
+            elif key in pending:  # first occurrence is replaced, duplicates are dropped
+                value = pending.pop(key)
+                if value is not None:
+                    new_lines.append(_format_env_line(key, value))
+        new_lines.extend(
+            _format_env_line(key, value) for key, value in pending.items() if value is not None
+        )
+
+        SecureFileHandler.write_file(env_path, "".join(line + "\n" for line in new_lines), 0o600)
+
+        for key, value in values.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    @staticmethod
+    def load_env(env_path: str) -> None:
+        """Load a .env file into os.environ once per process.
 
-        load_dotenv(env_path)
-        set_key(env_path, key, value)
+        load_dotenv never overrides variables that are already set and update_env keeps
+        os.environ in sync with its writes, so reloading the same file has no effect.
+        """
+        path = os.path.abspath(env_path)
+        if path not in _loaded_env_paths:
+            load_dotenv(path)
+            _loaded_env_paths.add(path)
 
     @staticmethod
     def read_env(key: str) -> str:
@@ -466,10 +614,28 @@ class SecureFileHandler:
         return value
 
 
-def cleanup(sensitive_data: list[bytes]) -> None:
+def _format_env_line(key: str, value: str) -> str:
+    """Format an entry the same way as dotenv.set_key."""
+    value = value.replace("'", "\\'")
+    return f"{key}='{value}'"
+
+
+def cleanup(sensitive_data: list[bytearray]) -> None:
+    """Zero the given buffers in place.
+
+    Only mutable buffers can be wiped, the immutable bytes copies PyNaCl requires are left to the
+    garbage collector.
+    """
     for data in sensitive_data:
         length = len(data)
-        buffer = ctypes.create_string_buffer(length)
-        ctypes.memmove(ctypes.addressof(buffer), data, length)
-        ctypes.memset(ctypes.addressof(buffer), 0, length)
-        del buffer
+        if length:
+            ctypes.memset((ctypes.c_char * length).from_buffer(data), 0, length)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_sealing_box(public_key: bytes) -> SealedBox[PublicKey]:
+    """Process-wide cache of the sealing boxes, shared by every Encryptor using the same key.
+
+    Only public keys are cached here, unsealing boxes stay on their Encryptor.
+    """
+    return SealedBox(PublicKey(public_key))